@@ -0,0 +1,81 @@
+import base64
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _jwt_expiry(token: str):
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except Exception:
+        return None
+
+
+class TokenManager(object):
+    def __init__(self, authenticate, ttl=3600, refresh_margin=300, retry_delay=5):
+        self._authenticate = authenticate
+        self._ttl = ttl
+        self._refresh_margin = refresh_margin
+        self._retry_delay = retry_delay
+        self._token = None
+        self._expires_at = 0.0
+        self._refreshing = False
+        self._cond = threading.Condition()
+        self._thread = None
+        self.refreshes = 0
+
+    def set(self, token: str):
+        with self._cond:
+            self._token = token
+            self._expires_at = _jwt_expiry(token) or time.time() + self._ttl
+            self._cond.notify_all()
+
+    def token(self, timeout=None):
+        with self._cond:
+            self._cond.wait_for(lambda: self._token is not None or (self._thread is None and not self._refreshing),
+                                timeout)
+            return self._token
+
+    def expires_in(self):
+        return self._expires_at - time.time()
+
+    def refresh(self, stale=None):
+        with self._cond:
+            if stale is not None and self._token != stale:
+                return self._token
+            if self._refreshing:
+                self._cond.wait_for(lambda: not self._refreshing)
+                return self._token
+            self._refreshing = True
+        token = None
+        try:
+            token = self._authenticate()
+        finally:
+            with self._cond:
+                self._refreshing = False
+                if token:
+                    self._token = token
+                    self._expires_at = _jwt_expiry(token) or time.time() + self._ttl
+                    self.refreshes += 1
+                self._cond.notify_all()
+        return self._token
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='token-refresh', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            if self._token is None or self.expires_in() <= self._refresh_margin:
+                if self.refresh(stale=self._token) is None or self.expires_in() <= self._refresh_margin:
+                    time.sleep(self._retry_delay)
+                    continue
+            time.sleep(max(self._retry_delay, self.expires_in() - self._refresh_margin))
@@ -0,0 +1,172 @@
+import argparse
+import itertools
+import logging
+import os
+import time
+import numpy as np
+from transport import shared_session, attach_limiter
+from ratelimit import TokenBucket, RequestScheduler
+from config import orderly_base_url, satori_base_url, satori_tokens, tokens, tp_sl_percentage, tp_sl_time, \
+    position_time, trade_amount_usd, planner_fee_rate, protect_on_entry, venue_rate_limits, endpoint_rate_limits
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = 'kline_cache'
+COLUMNS = ('t', 'open', 'high', 'low', 'close')
+BAR_SECONDS = 60
+
+
+def _cache_path(venue, token):
+    return os.path.join(CACHE_DIR, f'{venue}_{token}_1m.npy')
+
+
+def _fetch_orderly(token, start, end):
+    rows = []
+    step = 1000 * BAR_SECONDS
+    session = shared_session('orderly')
+    for chunk_start in range(start, end, step):
+        response = session.get(f'{orderly_base_url}/v1/tv/history', params={
+            'symbol': f'PERP_{token}_USDC', 'resolution': '1', 'from': chunk_start,
+            'to': min(end, chunk_start + step)}).json()
+        if response.get('s') != 'ok':
+            continue
+        rows.extend(zip(response['t'], response['o'], response['h'], response['l'], response['c']))
+    return rows
+
+
+def _fetch_satori(token, start, end):
+    rows = []
+    end_ms = end * 1000
+    session = shared_session('satori')
+    while end_ms > start * 1000:
+        response = session.post(
+            f'{satori_base_url}/api/contract-quotes-provider/contract-quotes/selectKlinePillarList',
+            json={'contractPairId': satori_tokens[token]['contractPairId'], 'limit': 500, 'period': '1MIN',
+                  'endTime': end_ms}).json()
+        candles = response.get('data') or []
+        if not candles:
+            break
+        for candle in candles:
+            rows.append((int(candle['time']) // 1000, float(candle['open']), float(candle['high']),
+                         float(candle['low']), float(candle['close'])))
+        earliest = min(int(candle['time']) for candle in candles)
+        if earliest >= end_ms:
+            break
+        end_ms = earliest - 1
+    return rows
+
+
+FETCHERS = {'orderly': _fetch_orderly, 'satori': _fetch_satori}
+
+
+def download(venue, token, days):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(venue, token)
+    end = int(time.time()) // BAR_SECONDS * BAR_SECONDS
+    start = end - days * 86400
+    existing = np.load(path) if os.path.exists(path) else np.empty((0, len(COLUMNS)))
+    if len(existing):
+        start = max(start, int(existing[-1, 0]) + BAR_SECONDS)
+    rows = FETCHERS[venue](token, start, end) if start < end else []
+    data = np.concatenate([existing, np.asarray(rows, dtype=np.float64).reshape(-1, len(COLUMNS))])
+    _, unique = np.unique(data[:, 0], return_index=True)
+    data = data[unique]
+    np.save(path, data)
+    logger.info(f'{venue} {token}: {len(data)} минутных свечей в {path}')
+    return data
+
+
+def load(venue, token):
+    return np.load(_cache_path(venue, token), mmap_mode='r')
+
+
+def simulate(candles, cycles, tp_sl_pct, tp_sl_time, position_time, trade_amount_usd, fee_rate, slippage_bps=2.0,
+             seed=None, protect_on_entry=protect_on_entry):
+    rng = np.random.default_rng(seed)
+    high, low, close, open_ = candles[:, 2], candles[:, 3], candles[:, 4], candles[:, 1]
+    tp_sl_delay = rng.integers(tp_sl_time[0], tp_sl_time[1] + 1, cycles)
+    position_delay = rng.integers(position_time[0], position_time[1] + 1, cycles)
+    if protect_on_entry:
+        protect_bars = np.zeros(cycles, dtype=int)
+    else:
+        protect_bars = (tp_sl_delay // BAR_SECONDS).astype(int)
+    hold_bars = np.maximum(1, np.ceil((tp_sl_delay + position_delay) / BAR_SECONDS).astype(int))
+    window = int(hold_bars.max())
+    starts = rng.integers(0, len(candles) - window - 1, cycles)
+    amounts = rng.integers(trade_amount_usd[0], trade_amount_usd[1] + 1, cycles).astype(float)
+    slip = slippage_bps / 10_000
+
+    entry = close[starts]
+    offsets = np.arange(1, window + 1)
+    idx = starts[:, None] + offsets[None, :]
+    active = (offsets[None, :] > protect_bars[:, None]) & (offsets[None, :] <= hold_bars[:, None])
+    upper = entry * (1 + tp_sl_pct)
+    lower = entry * (1 - tp_sl_pct)
+    hit = active & ((high[idx] >= upper[:, None]) | (low[idx] <= lower[:, None]))
+    triggered = hit.any(axis=1)
+    first = np.where(triggered, hit.argmax(axis=1), hold_bars - 1)
+    exit_idx = starts + first + 1
+    up = triggered & (high[exit_idx] >= upper)
+    trigger_price = np.where(up, upper, lower)
+    gapped = np.where(up, np.maximum(open_[exit_idx], trigger_price), np.minimum(open_[exit_idx], trigger_price))
+    exit_price = np.where(triggered, gapped, close[exit_idx])
+
+    gap_cost = np.abs(exit_price - np.where(triggered, trigger_price, exit_price)) / entry * amounts
+    slippage_cost = 4 * slip * amounts + gap_cost
+    fees = 2 * fee_rate * amounts
+    volume = 2 * amounts
+    return {
+        'cycles': cycles,
+        'tp_sl_hit_rate': float(triggered.mean()),
+        'avg_slippage_usd': float(slippage_cost.mean()),
+        'cost_per_1k_volume': float((slippage_cost + fees).sum() / volume.sum() * 1000),
+        'avg_hold_min': float((first + 1).mean() * BAR_SECONDS / 60),
+    }
+
+
+def sweep(candles, cycles, tp_sl_pcts, position_times, amounts, fee_rate, slippage_bps, seed=None,
+          protect_on_entry=protect_on_entry):
+    results = []
+    for pct, hold, amount in itertools.product(tp_sl_pcts, position_times, amounts):
+        result = simulate(candles, cycles, pct, tp_sl_time, hold, amount, fee_rate, slippage_bps, seed,
+                          protect_on_entry)
+        results.append(dict(result, tp_sl_percentage=pct, position_time=hold, trade_amount_usd=amount))
+    return sorted(results, key=lambda result: result['cost_per_1k_volume'])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest='command', required=True)
+    dl = sub.add_parser('download')
+    dl.add_argument('--venue', choices=sorted(FETCHERS), default='orderly')
+    dl.add_argument('--tokens', nargs='+', default=tokens)
+    dl.add_argument('--days', type=int, default=30)
+    sw = sub.add_parser('sweep')
+    sw.add_argument('--venue', choices=sorted(FETCHERS), default='orderly')
+    sw.add_argument('--token', default=tokens[0])
+    sw.add_argument('--cycles', type=int, default=20000)
+    sw.add_argument('--slippage-bps', type=float, default=2.0)
+    sw.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    if args.command == 'download':
+        attach_limiter(args.venue, RequestScheduler(args.venue, TokenBucket(*venue_rate_limits[args.venue]),
+                                                    endpoint_rate_limits.get(args.venue)))
+        for token in args.tokens:
+            download(args.venue, token, args.days)
+    else:
+        candles = load(args.venue, args.token)
+        pcts = [round(tp_sl_percentage * k, 4) for k in (0.25, 0.5, 0.75, 1, 1.5, 2)]
+        holds = [[position_time[0] * k, position_time[1] * k] for k in (1, 2, 5, 10)]
+        sizes = [trade_amount_usd, [trade_amount_usd[0] * 2, trade_amount_usd[1] * 2]]
+        started = time.perf_counter()
+        results = sweep(candles, args.cycles, pcts, holds, sizes, planner_fee_rate, args.slippage_bps)
+        elapsed = time.perf_counter() - started
+        print(f'{"tp_sl %":>8}{"hold, с":>14}{"размер":>12}{"TP/SL":>8}{"слиппедж":>10}{"на 1k объема":>14}')
+        for result in results[:args.top]:
+            print(f'{result["tp_sl_percentage"] * 100:>8.2f}{str(result["position_time"]):>14}'
+                  f'{str(result["trade_amount_usd"]):>12}{result["tp_sl_hit_rate"] * 100:>7.1f}%'
+                  f'{result["avg_slippage_usd"]:>10.4f}{result["cost_per_1k_volume"]:>14.3f}')
+        total = len(results) * args.cycles
+        print(f'\n{total} циклов за {elapsed:.2f} с ({total / elapsed:,.0f} циклов/с)')
@@ -0,0 +1,60 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from orderly import OrderlySigner
+from functions import EthSigner
+
+URL = "https://api-evm.orderly.org/v1/order"
+BODY = {"symbol": "PERP_ETH_USDC", "order_type": "MARKET", "order_quantity": 0.0123, "side": "BUY"}
+MESSAGE = ('{"quantity":0.012,"address":"0x0000000000000000000000000000000000000000","expireTime":"1718000000000",'
+           '"contractPairId":1,"isClose":false,"amount":40}')
+
+
+def _rate(fn, seconds):
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        count += 1
+    return count / seconds
+
+
+def bench_orderly(seconds=2.0):
+    signer = OrderlySigner("0xbench", Ed25519PrivateKey.generate())
+    return _rate(lambda: signer.sign("POST", URL, BODY), seconds)
+
+
+def bench_satori(seconds=2.0):
+    private_key = Account.create().key
+    signer = EthSigner(private_key)
+    cached = _rate(lambda: signer.sign(MESSAGE), seconds)
+    per_call = _rate(lambda: Account.from_key(private_key).sign_message(encode_defunct(text=MESSAGE)), seconds)
+    return cached, per_call
+
+
+def import_time(module, runs=5):
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    print(f"orderly sign_request: {bench_orderly():,.0f} подписей/сек")
+    cached, per_call = bench_satori()
+    print(f"satori EthSigner: {cached:,.0f} подписей/сек (from_key на каждый вызов: {per_call:,.0f})")
+    for module in ("eth_account", "web3"):
+        try:
+            print(f"python -c 'import {module}': {import_time(module) * 1000:.0f} мс")
+        except subprocess.CalledProcessError:
+            print(f"{module} не установлен")
@@ -0,0 +1,68 @@
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CONSTRUCT = '''
+import os
+import time
+from base58 import b58encode
+wallet = {'account_id': '0xbench', 'orderly_secret': b58encode(os.urandom(32)).decode(),
+          'public_key': '0x' + '0' * 40, 'private_key': '0x' + os.urandom(32).hex(),
+          'user-agent': 'bench', 'sec-ch-ua': 'bench'}
+started = time.perf_counter()
+import engine
+imported = time.perf_counter()
+from orderly import OrderlyTrading
+from satori import SatoriTrading
+OrderlyTrading(wallet=wallet, base_url='http://127.0.0.1:9')
+SatoriTrading(wallet=wallet, api_token='bench', base_url='http://127.0.0.1:9')
+print(imported - started, time.perf_counter() - imported)
+'''
+
+
+def import_profile(module):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        head, cumulative_us, name = line.split('|')
+        depth = len(name) - len(name.lstrip())
+        rows.append((int(cumulative_us), int(head.split(':')[1]), name.strip(), depth))
+    return rows
+
+
+def wall_time(code, runs):
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, capture_output=True)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='engine')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = import_profile(args.module)
+    top_depth = min(row[3] for row in rows)
+    top_level = [row for row in rows if row[3] == top_depth]
+    print(f'{"cumulative, мс":>15}{"self, мс":>10}  модуль')
+    for cumulative_us, self_us, name, _ in sorted(rows, reverse=True)[:args.top]:
+        print(f'{cumulative_us / 1000:>15.1f}{self_us / 1000:>10.1f}  {name}')
+    print(f'\nimport {args.module}: {sum(row[0] for row in top_level) / 1000:.1f} мс (-X importtime)')
+    print(f'python -c "import {args.module}": {wall_time(f"import {args.module}", args.runs) * 1000:.0f} мс')
+
+    output = subprocess.run([sys.executable, '-c', CONSTRUCT], cwd=ROOT, capture_output=True,
+                            text=True, check=True).stdout.split()
+    print(f'импорт до клиентов: {float(output[0]) * 1000:.0f} мс, создание клиентов: {float(output[1]) * 1000:.0f} мс')
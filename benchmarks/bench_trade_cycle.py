@@ -0,0 +1,111 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from base58 import b58encode
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives import serialization
+from eth_account import Account
+
+import logic
+from mock_venues import MockVenues, Faults
+from orderly import OrderlyTrading
+from satori import SatoriTrading
+
+samples = defaultdict(list)
+
+
+def _timed(name, fn):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            samples[name].append((time.perf_counter() - started) * 1000)
+    return wrapper
+
+
+def _instrument(bot, prefix, methods):
+    for method in methods:
+        setattr(bot, method, _timed(f'{prefix}.{method}', getattr(bot, method)))
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def bench_wallet():
+    secret = Ed25519PrivateKey.generate().private_bytes(
+        serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption())
+    account = Account.create()
+    return {
+        'account_id': '0xbench',
+        'orderly_api': '',
+        'orderly_secret': b58encode(secret).decode(),
+        'public_key': account.address,
+        'private_key': account.key.hex(),
+        'user-agent': 'bench',
+        'sec-ch-ua': 'bench',
+    }
+
+
+def run(cycles, max_open_pairs, paired, faults):
+    venues = MockVenues(faults).start()
+    wallet = bench_wallet()
+    orderly_bot = OrderlyTrading(wallet=wallet, base_url=venues.orderly_url)
+    satori_bot = SatoriTrading(wallet=wallet, base_url=venues.satori_url)
+    orderly_bot.load_symbols()
+    satori_bot.load_symbols()
+    _instrument(orderly_bot, 'orderly', ['prepare_market_order', 'send_market_order', 'tp_sl',
+                                         'close_market_position'])
+    _instrument(satori_bot, 'satori', ['check_balance', 'prepare_open_market_position',
+                                       'submit_open_market_position', 'tp_sl', 'close_market_position'])
+
+    paired_open = logic.open_positions_paired
+
+    def recording_open(*args):
+        result = paired_open(*args)
+        if result[3] is not None:
+            samples['open_to_hedge_skew'].append(result[3]['fill_skew_ms'])
+        return result
+
+    logic.open_positions_paired = recording_open
+    amount = 50
+    started = time.perf_counter()
+    logic.trade_cycle(orderly_bot, satori_bot, ['ETH', 'OP', 'ARB', 'SOL'], [0.25, 0.25, 0.25, 0.25],
+                      [amount, amount], cycles * amount * 2, 20, [0, 0], [0, 0], [0, 0],
+                      paired_execution=paired, max_open_pairs=max_open_pairs)
+    elapsed = time.perf_counter() - started
+    logic.open_positions_paired = paired_open
+    venues.stop()
+    return elapsed
+
+
+def report(cycles, elapsed):
+    print(f'{"вызов":<45}{"n":>6}{"p50, мс":>10}{"p99, мс":>10}')
+    for name in sorted(samples):
+        values = samples[name]
+        print(f'{name:<45}{len(values):>6}{_percentile(values, 0.5):>10.2f}{_percentile(values, 0.99):>10.2f}')
+    print(f'\nЦиклов в минуту: {cycles / elapsed * 60:.1f} ({cycles} циклов за {elapsed:.2f} с)')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cycles', type=int, default=50)
+    parser.add_argument('--max-open-pairs', type=int, default=1)
+    parser.add_argument('--serial', action='store_true')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    os.chdir(tempfile.mkdtemp())
+    elapsed = run(args.cycles, args.max_open_pairs, not args.serial,
+                  Faults(args.latency, args.jitter, args.error_rate))
+    report(args.cycles, elapsed)
@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def _local_us():
+    return time.time_ns() // 1000
+
+
+class ServerClock(object):
+    def __init__(self, fetch_server_ms, samples=5, resync_interval=300, history=8, retry_interval=5):
+        self._fetch = fetch_server_ms
+        self._samples = samples
+        self._resync_interval = resync_interval
+        self._retry_interval = retry_interval
+        self._retry_at = 0.0
+        self._history = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._offset_us = None
+        self._ref_us = 0
+        self._drift = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def synced(self):
+        return self._offset_us is not None
+
+    def _sample(self):
+        best = None
+        for _ in range(self._samples):
+            t0 = _local_us()
+            server_ms = self._fetch()
+            t1 = _local_us()
+            if server_ms is None:
+                continue
+            rtt = t1 - t0
+            offset = server_ms * 1000 - (t0 + t1) // 2
+            if best is None or rtt < best[0]:
+                best = (rtt, offset, t1)
+        return best
+
+    def sync(self) -> bool:
+        best = self._sample()
+        if best is None:
+            logger.error('Не удалось синхронизировать время с Satori')
+            return False
+        rtt, offset, local = best
+        with self._lock:
+            self._history.append((local, offset))
+            self._drift = self._estimate_drift()
+            self._offset_us = offset
+            self._ref_us = local
+        logger.debug(f'Смещение часов Satori: {offset / 1000:.1f} мс, RTT {rtt / 1000:.1f} мс, '
+                     f'дрейф {self._drift * 1e6:.2f} ppm')
+        return True
+
+    def _estimate_drift(self):
+        if len(self._history) < 2:
+            return 0.0
+        n = len(self._history)
+        mean_x = sum(x for x, _ in self._history) / n
+        mean_y = sum(y for _, y in self._history) / n
+        var = sum((x - mean_x) ** 2 for x, _ in self._history)
+        if var == 0:
+            return 0.0
+        return sum((x - mean_x) * (y - mean_y) for x, y in self._history) / var
+
+    def _fetch_once(self):
+        if time.monotonic() < self._retry_at:
+            return None
+        t0 = _local_us()
+        server_ms = self._fetch()
+        t1 = _local_us()
+        if server_ms is None:
+            self._retry_at = time.monotonic() + self._retry_interval
+            return None
+        return server_ms * 1000 + (t1 - t0) // 2
+
+    def now_us(self):
+        self.start()
+        if not self.synced:
+            return self._fetch_once()
+        local = _local_us()
+        with self._lock:
+            return local + self._offset_us + int(self._drift * (local - self._ref_us))
+
+    def now_ms(self):
+        now = self.now_us()
+        return None if now is None else now // 1000
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='server-clock', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self._resync_interval if self.synced else self._retry_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f'Ошибка синхронизации времени Satori: {e}')
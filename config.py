@@ -65,6 +65,77 @@ trade_pause_time = [140, 270]
 needed_vol = 30000
 satori_leverage = 20
 tp_sl_percentage = 0.032
-
-
-
+paired_execution = True
+http_pool_size = 10
+http_timeout = 10
+http_retries = 3
+http_backoff = 0.2
+clock_samples = 5
+clock_resync_interval = 300
+clock_retry_interval = 5
+orderly_ws_url = 'wss://ws-evm.orderly.org/ws/stream/{account_id}'
+price_max_age = 5
+price_poll_interval = 2
+wallet_volumes = {
+    'main': needed_vol,
+}
+venue_rate_limits = {
+    'orderly': (10, 10),
+    'satori': (5, 5),
+}
+max_open_pairs = 1
+position_cache_ttl = 5
+flatten_workers = 8
+flatten_retries = 3
+flatten_retry_delay = 1
+orderly_base_url = 'https://api-evm.orderly.org'
+satori_base_url = 'https://zksync.satori.finance'
+metrics_port = 9108
+metrics_summary_interval = 300
+auth_timeout = 30
+presign_lead_time = 10
+presign_min_ttl = 30
+presign_price_tolerance = 0.002
+satori_token_ttl = 3600
+satori_token_refresh_margin = 300
+journal_path = 'journal.db'
+journal_flush_timeout = 60
+use_planner = True
+planner_fee_rate = 0.0011
+symbols_cache_path = 'symbols_cache.json'
+symbols_cache_ttl = 86400
+endpoint_timeouts = {
+    '/v1/order': 5,
+    '/v1/algo/order': 5,
+    '/api/contract-provider/contract/order/openPosition': 5,
+    '/api/contract-provider/contract/order/closePosition': 5,
+    '/api/contract-quotes-provider/contract-quotes/selectKlinePillarList': 3,
+}
+retry_attempts = 3
+retry_base_delay = 0.2
+retry_max_delay = 2
+breaker_failure_threshold = 5
+breaker_reset_timeout = 30
+unwind_retry_delay = 10
+open_backoff_max = 600
+protect_on_entry = True
+orderly_private_ws_url = 'wss://ws-private-evm.orderly.org/v2/ws/private/stream/{account_id}'
+hedge_poll_interval = 1
+endpoint_rate_limits = {
+    'orderly': {
+        '/v1/order': (10, 10),
+        '/v1/batch-order': (1, 1),
+        '/v1/algo/order': (10, 10),
+        '/v1/positions': (3, 30),
+    },
+    'satori': {
+        '/api/contract-provider/contract/order/openPosition': (2, 2),
+        '/api/contract-provider/contract/order/closePosition': (2, 2),
+        '/api/contract-provider/contract/updateStopConfig': (2, 2),
+        '/api/contract-provider/contract/selectContractPositionList': (3, 5),
+    },
+}
+orderly_batch_window = 0.003
+events_log_path = 'events.jsonl'
+events_log_max_bytes = 50 * 1024 * 1024
+events_log_backups = 5
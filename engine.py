@@ -0,0 +1,108 @@
+import logging
+import threading
+from satori import SatoriTrading
+from orderly import OrderlyTrading
+from prices import PriceService
+from ratelimit import TokenBucket, RequestScheduler
+from functions import get_orderly_token_price
+from logic import trade_cycle
+from journal import Journal
+import config
+import transport
+import metrics
+import resilience
+
+logger = logging.getLogger(__name__)
+
+
+class Progress(object):
+    def __init__(self, targets: dict):
+        self.targets = dict(targets)
+        self.volumes = {wallet: 0 for wallet in targets}
+        self._lock = threading.Lock()
+
+    def add(self, wallet, amount_usd):
+        with self._lock:
+            self.volumes[wallet] += amount_usd
+
+    def tracker(self, wallet):
+        return lambda amount_usd: self.add(wallet, amount_usd)
+
+    def summary(self):
+        with self._lock:
+            lines = [f'{wallet}: {self.volumes[wallet]}/{self.targets[wallet]}' for wallet in self.targets]
+            total = sum(self.volumes.values())
+        return f'Общий объем: {total}/{sum(self.targets.values())}\n' + '\n'.join(lines)
+
+
+def _plan(orderly_bot, satori_bot, target):
+    from planner import plan_schedule
+    balance = satori_bot.check_balance(config.tokens[0])
+    return plan_schedule(target, balance, config.satori_leverage, config.tokens, config.tokens_probs,
+                         config.orderly_tokens, config.satori_tokens, config.trade_amount_usd, config.tp_sl_time,
+                         config.position_time, config.trade_pause_time, config.max_open_pairs,
+                         fee_rate=config.planner_fee_rate).trades
+
+
+def _run_wallet(name, orderly_bot, satori_bot, target, progress, journal):
+    schedule = None
+    if config.use_planner:
+        try:
+            schedule = _plan(orderly_bot, satori_bot, target)
+        except Exception as e:
+            logger.error(f'Не удалось составить план сделок для {name}, торгуем без плана: {e}')
+    try:
+        trade_cycle(orderly_bot, satori_bot, config.tokens, config.tokens_probs, config.trade_amount_usd, target,
+                    config.satori_leverage, config.tp_sl_time, config.position_time, config.trade_pause_time,
+                    config.paired_execution, progress=progress.tracker(name),
+                    max_open_pairs=config.max_open_pairs, journal=journal, wallet=name, schedule=schedule,
+                    orderly_ws_url=config.orderly_private_ws_url)
+        logger.info(f'Аккаунт {name} набрал нужный объем')
+    except SystemExit:
+        logger.error(f'Аккаунт {name} остановлен')
+    except Exception as e:
+        logger.error(f'Аккаунт {name} остановлен из-за ошибки: {e}')
+
+
+def run(wallet_volumes: dict, wallets: dict, report_interval=60):
+    if config.metrics_port:
+        metrics.serve(config.metrics_port)
+    metrics.log_summary_every(config.metrics_summary_interval)
+    limiters = {venue: RequestScheduler(venue, TokenBucket(*limit), config.endpoint_rate_limits.get(venue))
+                for venue, limit in config.venue_rate_limits.items()}
+    for venue, limiter in limiters.items():
+        transport.attach_limiter(venue, limiter)
+    bots = {}
+    for name in wallet_volumes:
+        logger.info(f'Текущий аккаунт: {name}')
+        bots[name] = (OrderlyTrading(wallet=wallets[name], limiter=limiters['orderly']),
+                      SatoriTrading(wallet=wallets[name], limiter=limiters['satori']))
+        for bot in bots[name]:
+            bot.load_symbols()
+
+    first = next(iter(wallet_volumes))
+    prices = PriceService(config.tokens, {'orderly': get_orderly_token_price, 'satori': bots[first][1].get_token_price},
+                          orderly_ws_url=config.orderly_ws_url.format(account_id=wallets[first]['account_id']),
+                          max_age=config.price_max_age, poll_interval=config.price_poll_interval)
+    prices.start()
+    progress = Progress(wallet_volumes)
+    journal = Journal(config.journal_path) if config.journal_path else None
+
+    workers = []
+    for name, target in wallet_volumes.items():
+        orderly_bot, satori_bot = bots[name]
+        orderly_bot.prices = prices
+        satori_bot.prices = prices
+        worker = threading.Thread(target=_run_wallet, name=f'wallet-{name}',
+                                  args=(name, orderly_bot, satori_bot, target, progress, journal))
+        worker.start()
+        workers.append(worker)
+
+    while any(worker.is_alive() for worker in workers):
+        for worker in workers:
+            worker.join(report_interval / len(workers))
+        logger.info(progress.summary())
+        breakers = resilience.summary()
+        if breakers:
+            logger.info(f'Площадки:\n{breakers}')
+    return progress
@@ -0,0 +1,86 @@
+import json
+import logging
+import os
+import sys
+from writer import BatchWriter
+from config import events_log_path, events_log_max_bytes, events_log_backups
+
+CONSOLE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def emit(logger, event: str, message: str, level=logging.INFO, **fields):
+    logger.log(level, message, extra={'event': event, 'fields': fields})
+
+
+class _EnqueueHandler(logging.Handler):
+    def __init__(self, writer):
+        super().__init__()
+        self._writer = writer
+
+    def emit(self, record):
+        self._writer.put(record)
+
+
+class EventWriter(object):
+    def __init__(self, path=events_log_path, max_bytes=events_log_max_bytes, backups=events_log_backups,
+                 batch_size=256, flush_interval=0.2, stream=sys.stderr):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self._stream = stream
+        self._console = logging.Formatter(CONSOLE_FORMAT)
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+        self._writer = BatchWriter(self._write, 'event-writer', batch_size, flush_interval, self._write_failed)
+        self.handler = _EnqueueHandler(self._writer)
+
+    def flush(self, timeout=None):
+        try:
+            return self._writer.flush(timeout)
+        except Exception:
+            return False
+
+    def _write_failed(self, error):
+        (self._stream or sys.stderr).write(f'Ошибка записи журнала событий: {error}\n')
+
+    def _write(self, records):
+        if self._stream is not None:
+            self._stream.write(''.join(self._console.format(record) + '\n' for record in records))
+            self._stream.flush()
+        if self._file is None:
+            return
+        self._file.write(''.join(json.dumps(self._event(record), ensure_ascii=False, default=str) + '\n'
+                                 for record in records))
+        self._file.flush()
+        if self._max_bytes and self._file.tell() >= self._max_bytes:
+            self._rotate()
+
+    def _event(self, record):
+        event = {'ts': round(record.created, 6), 'level': record.levelname, 'logger': record.name,
+                 'thread': record.threadName, 'event': getattr(record, 'event', 'log')}
+        event.update(getattr(record, 'fields', None) or {})
+        event['message'] = record.getMessage()
+        if record.exc_info:
+            event['exc'] = self._console.formatException(record.exc_info)
+        return event
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self._backups - 1, 0, -1):
+            source = f'{self._path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self._path}.{index + 1}')
+        if self._backups:
+            os.replace(self._path, f'{self._path}.1')
+        else:
+            os.remove(self._path)
+        self._file = open(self._path, 'a', encoding='utf-8')
+
+
+def configure(level=logging.INFO, path=events_log_path) -> EventWriter:
+    writer = EventWriter(path)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(writer.handler)
+    root.setLevel(level)
+    return writer
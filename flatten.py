@@ -0,0 +1,98 @@
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import satori_tokens, flatten_workers, flatten_retries, flatten_retry_delay
+from satori import _generate_order_id
+
+logger = logging.getLogger(__name__)
+
+_satori_pairs = {info['contractPairId']: token for token, info in satori_tokens.items()}
+
+
+def _orderly_legs(orderly_bot):
+    orderly_bot.positions.invalidate()
+    legs = []
+    for position in orderly_bot.positions.all():
+        token = position['symbol'].split('_')[1]
+        long = position['position_qty'] > 0
+
+        def close(token=token, long=long):
+            return orderly_bot.close_market_position(token, long)
+
+        def still_open(symbol=position['symbol']):
+            orderly_bot.positions.invalidate()
+            return orderly_bot.positions.get(symbol) is not None
+
+        legs.append(('orderly', token, close, still_open))
+    return legs
+
+
+def _satori_legs(satori_bot):
+    satori_bot.positions.invalidate()
+    legs = []
+    for position in satori_bot.positions.all():
+        token = _satori_pairs.get(position['contractPairId'], str(position['contractPairId']))
+
+        def close(position=position, token=token):
+            return satori_bot.close_position(position, _generate_order_id(), token)
+
+        def still_open(position_id=position['id']):
+            satori_bot.positions.invalidate()
+            return satori_bot.positions.by_id(position_id) is not None
+
+        legs.append(('satori', token, close, still_open))
+    return legs
+
+
+def _close_leg(leg, retries, retry_delay):
+    venue, token, close, still_open = leg
+    started = time.perf_counter()
+    result = {'venue': venue, 'token': token, 'closed': False, 'attempts': 0, 'error': None}
+    for attempt in range(1, retries + 1):
+        result['attempts'] = attempt
+        try:
+            if close() or not still_open():
+                result['closed'] = True
+                break
+        except Exception as e:
+            result['error'] = repr(e)
+        time.sleep(retry_delay * attempt)
+    result['latency_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def flatten(orderly_bot, satori_bot, max_workers=flatten_workers, retries=flatten_retries,
+            retry_delay=flatten_retry_delay):
+    legs = []
+    for venue, collect, bot in (('orderly', _orderly_legs, orderly_bot), ('satori', _satori_legs, satori_bot)):
+        try:
+            legs.extend(collect(bot))
+        except Exception as e:
+            logger.error(f'Не удалось получить позиции {venue}: {e}')
+
+    if not legs:
+        logger.info('Открытых позиций нет')
+        return []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(lambda leg: _close_leg(leg, retries, retry_delay), legs))
+
+    for result in results:
+        status = 'закрыта' if result['closed'] else 'НЕ закрыта'
+        logger.info(f'{result["venue"]} {result["token"]}: {status} за {result["latency_ms"]:.0f} мс, '
+                    f'попыток {result["attempts"]}' + (f', ошибка {result["error"]}' if result['error'] else ''))
+    failed = sum(not result['closed'] for result in results)
+    logger.info(f'Закрыто {len(results) - failed}/{len(results)} позиций')
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    from wallets import wallets
+    from orderly import OrderlyTrading
+    from satori import SatoriTrading
+
+    for wallet in sys.argv[1:] or ['main']:
+        logger.info(f'Текущий аккаунт: {wallet}')
+        flatten(OrderlyTrading(wallet=wallets[wallet]), SatoriTrading(wallet=wallets[wallet]))
@@ -1,18 +1,31 @@
-from web3 import Web3
-from eth_account.messages import encode_defunct
+from functools import lru_cache
 import random
 import string
-import requests
-from base58 import b58encode
+from transport import shared_session
+from metrics import timed
+from config import orderly_base_url
 
-web3 = Web3()
 
+class EthSigner(object):
+    def __init__(self, private_key):
+        from eth_account import Account
+        from eth_account.messages import encode_defunct
+        self._account = Account.from_key(private_key)
+        self._encode_defunct = encode_defunct
+        self.address = self._account.address
 
-def sign_with_key(private_key, message):
-    account = web3.eth.account.from_key(private_key)
-    signature = account.sign_message(encode_defunct(text=message)).signature.hex()
+    @timed('satori sign')
+    def sign(self, message: str) -> str:
+        return self._account.sign_message(self._encode_defunct(text=message)).signature.hex()
+
+
+@lru_cache(maxsize=64)
+def get_signer(private_key) -> EthSigner:
+    return EthSigner(private_key)
 
-    return signature
+
+def sign_with_key(private_key, message):
+    return get_signer(private_key).sign(message)
 
 
 def generate_random_string(length=21):
@@ -21,25 +34,14 @@ def generate_random_string(length=21):
     return random_string
 
 
-def generate_unique_string(existing_list, length=21):
-    while True:
-        new_string = generate_random_string(length)
-        if new_string not in existing_list:
-            return new_string
-
-
-def get_orderly_token_price(token: str):
-    url = f"https://api-evm.orderly.network/v1/public/futures/PERP_{token}_USDC"
-    response_ = requests.request("GET", url).json()['data']['index_price']
+def get_orderly_token_price(token: str, base_url=orderly_base_url):
+    url = f"{base_url}/v1/public/futures/PERP_{token}_USDC"
+    response_ = shared_session('orderly').get(url).json()['data']['index_price']
     return response_
 
 
-def create_session_orderly():
-    session = requests.Session()
-    return session
-
-
 def encode_key(key: bytes):
+    from base58 import b58encode
     return "ed25519:%s" % b58encode(key).decode("utf-8")
 
 
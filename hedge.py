@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import threading
+import time
+from metrics import registry
+from events import emit
+from ws import orderly_stream
+
+logger = logging.getLogger(__name__)
+
+
+class HedgeMonitor(object):
+    def __init__(self, orderly_bot, satori_bot, poll_interval=1.0, orderly_ws_url=None):
+        self.orderly_bot = orderly_bot
+        self.satori_bot = satori_bot
+        self._poll_interval = poll_interval
+        self._orderly_ws_url = orderly_ws_url
+        self._pairs = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._loop = None
+
+    def watch(self, key: str, token: str, satori_pos: bool, on_broken):
+        with self._lock:
+            self._pairs[key] = (token, satori_pos, on_broken)
+        self.start()
+
+    def unwatch(self, key: str):
+        with self._lock:
+            return self._pairs.pop(key, None) is not None
+
+    def notify(self):
+        self._wake.set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='hedge-monitor', daemon=True)
+        self._thread.start()
+        if self._orderly_ws_url:
+            self._loop = asyncio.new_event_loop()
+            threading.Thread(target=self._loop.run_forever, name='hedge-stream', daemon=True).start()
+            url = self._orderly_ws_url.format(account_id=self.orderly_bot.account_id)
+            asyncio.run_coroutine_threadsafe(orderly_stream(url, self._subscriptions, self._on_orderly_message,
+                                                            'Приватный поток Orderly (позиции проверяются опросом)'),
+                                             self._loop)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._poll_interval)
+            self._wake.clear()
+            if self._pairs:
+                try:
+                    self.check()
+                except Exception as e:
+                    logger.error(f'Ошибка проверки хеджа: {e}')
+
+    def check(self):
+        with self._lock:
+            pairs = list(self._pairs.items())
+        if not pairs:
+            return
+        self.orderly_bot.positions.invalidate()
+        self.satori_bot.positions.invalidate()
+        for key, (token, satori_pos, on_broken) in pairs:
+            orderly_open = self.orderly_bot.get_position_info(token)[1] != 0
+            satori_open = self.satori_bot.get_position(token, satori_pos) is not None
+            if orderly_open and satori_open or not self.unwatch(key):
+                continue
+            detected = time.perf_counter()
+            if not orderly_open and not satori_open:
+                registry.inc('hedge both closed')
+                emit(logger, 'hedge_closed', f'Обе ноги {token} закрылись по TP/SL', token=token, pair_id=key)
+                on_broken(detected, None)
+                continue
+            closed, survivor = ('Satori', 'Orderly') if orderly_open else ('Orderly', 'Satori')
+            registry.inc('hedge imbalance')
+            emit(logger, 'hedge_imbalance', f'Позиция {token} на {closed} закрылась по TP/SL, закрываем ногу на '
+                                            f'{survivor}', logging.WARNING, token=token, pair_id=key,
+                 closed_venue=closed.lower(), venue=survivor.lower())
+            on_broken(detected, survivor.lower())
+
+    def _subscriptions(self):
+        return [{'id': 'auth', 'event': 'auth', 'params': self.orderly_bot.ws_auth()},
+                {'id': 'position', 'event': 'subscribe', 'topic': 'position'},
+                {'id': 'execution', 'event': 'subscribe', 'topic': 'executionreport'}]
+
+    def _on_orderly_message(self, message):
+        if message.get('topic') in ('position', 'executionreport') and self._pairs:
+            self.notify()
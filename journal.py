@@ -0,0 +1,68 @@
+import json
+import logging
+import sqlite3
+import time
+from writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+OPENING = 'opening'
+OPEN = 'open'
+PROTECT = 'protect'
+CLOSE = 'close'
+
+
+class Journal(object):
+    def __init__(self, path='journal.db', batch_size=32, flush_interval=0.2):
+        self._path = path
+        self._conn = None
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY, ts REAL NOT NULL, '
+                     'wallet TEXT NOT NULL, pair_id TEXT NOT NULL, step TEXT NOT NULL, data TEXT NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS events_wallet ON events (wallet, pair_id)')
+        conn.commit()
+        conn.close()
+        self._writer = BatchWriter(self._write, 'journal-writer', batch_size, flush_interval,
+                                   lambda e: logger.error(f'Ошибка записи журнала: {e}'))
+
+    def _connect(self):
+        conn = sqlite3.connect(self._path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+    def record(self, wallet: str, pair_id: str, step: str, **data):
+        self._writer.put((time.time(), wallet, pair_id, step, json.dumps(data)))
+
+    def flush(self, timeout=None):
+        return self._writer.flush(timeout)
+
+    def _write(self, rows):
+        if self._conn is None:
+            self._conn = self._connect()
+        with self._conn:
+            self._conn.executemany('INSERT INTO events (ts, wallet, pair_id, step, data) VALUES (?, ?, ?, ?, ?)', rows)
+
+    def replay(self, wallet: str):
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT pair_id, step, data FROM events WHERE wallet = ? ORDER BY id',
+                                (wallet,)).fetchall()
+        finally:
+            conn.close()
+        vol = 0
+        pairs = {}
+        for pair_id, step, data in rows:
+            data = json.loads(data)
+            if step == OPENING:
+                pairs[pair_id] = dict(data, step=OPENING)
+            elif step == OPEN:
+                pairs.setdefault(pair_id, {}).update(data, step=OPEN)
+                vol += pairs[pair_id]['amount_usd']
+            elif step == CLOSE:
+                pair = pairs.pop(pair_id, None)
+                if pair is not None and pair['step'] != OPENING and data.get('counted', True):
+                    vol += pair['amount_usd']
+            elif pair_id in pairs:
+                pairs[pair_id].update(data, step=step)
+        return vol, pairs
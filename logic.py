@@ -1,7 +1,18 @@
 import random
-import sys
 import time
+import threading
 import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from scheduler import Scheduler
+from metrics import registry
+from events import emit
+from resilience import breaker
+from hedge import HedgeMonitor
+from config import presign_lead_time, unwind_retry_delay, open_backoff_max, protect_on_entry, hedge_poll_interval, \
+    journal_flush_timeout
+from journal import OPENING, OPEN, PROTECT, CLOSE
+from planner import PlannedTrade
 
 logger = logging.getLogger(__name__)
 
@@ -10,7 +21,7 @@ def check_satori_balance(bot, token, amount_usd, leverage):
     balance = bot.check_balance(token)
     if balance * leverage < amount_usd:
         logger.info("Недостаточно баланса на Satori")
-        sys.exit()
+        return None
     return balance
 
 
@@ -18,69 +29,411 @@ def open_positions(satori_bot, orderly_bot, token, satori_pos, orderly_pos, amou
     satori_order_id, satori_status = satori_bot.open_market_position(token=token, long=satori_pos,
                                                                      amount_usd=amount_usd)
     if not satori_status:
-        sys.exit()
+        return satori_order_id, satori_status, None
 
     orderly_status = orderly_bot.open_market_position(token=token, long=orderly_pos, amount_usd=amount_usd)
-    if not orderly_status:
-        satori_close_status = satori_bot.close_market_position(token, satori_order_id)
-        if not satori_close_status:
-            sys.exit()
     return satori_order_id, satori_status, orderly_status
 
 
-def set_tp_sl(satori_bot, orderly_bot, token, satori_pos, orderly_pos):
-    orderly_tp_sl_status = orderly_bot.tp_sl(token, orderly_pos)
-    satori_tp_sl_status = satori_bot.tp_sl(token, satori_pos)
-    if not orderly_tp_sl_status or not satori_tp_sl_status:
-        satori_close_status = satori_bot.close_market_position(token, satori_pos)
-        orderly_close_status = orderly_bot.close_market_position(token, orderly_pos)
-        if not satori_close_status or not orderly_close_status:
-            logger.error("Не удалось закрыть одну из позиций")
-            sys.exit()
-        else:
-            logger.info("Позиции закрыты из-за проблемы с TP/SL")
-            sys.exit()
+def _timed(fn, *args):
+    sent = time.perf_counter()
+    result = fn(*args)
+    return result, sent, time.perf_counter()
 
 
-def close_positions(satori_bot, orderly_bot, token, satori_order_id, orderly_pos):
-    satori_close_status = satori_bot.close_market_position(token, satori_order_id)
-    orderly_close_status = orderly_bot.close_market_position(token, orderly_pos)
-    if not satori_close_status or not orderly_close_status:
-        sys.exit()
+def open_positions_paired(satori_bot, orderly_bot, token, satori_pos, orderly_pos, amount_usd):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        satori_prep = pool.submit(satori_bot.prepare_open_market_position, token, satori_pos, amount_usd)
+        orderly_prep = pool.submit(orderly_bot.prepare_market_order, token, orderly_pos, amount_usd)
+        satori_order, orderly_order = satori_prep.result(), orderly_prep.result()
+        if satori_order is None or orderly_order is None:
+            logger.error('Не удалось подготовить ордера, сделка не открыта')
+            return None, None if satori_order else False, None if orderly_order else False, None
 
+        satori_leg = pool.submit(_timed, satori_bot.submit_open_market_position, satori_order)
+        orderly_leg = pool.submit(_timed, orderly_bot.send_market_order, orderly_order)
+        (satori_order_id, satori_status), satori_sent, satori_ack = satori_leg.result()
+        orderly_status, orderly_sent, orderly_ack = orderly_leg.result()
 
-def trade_cycle(orderly_bot, satori_bot, tokens, tokens_probs, trade_amount_usd, needed_vol, satori_leverage,
-                tp_sl_time, position_time, trade_pause_time):
-    vol = 0
-    while vol < needed_vol:
-        token = random.choices(tokens, tokens_probs, k=1)[0]
-        amount_usd = random.randint(trade_amount_usd[0], trade_amount_usd[1])
-        satori_pos = random.choice([True, False])
+    latency = {
+        'send_skew_ms': abs(satori_sent - orderly_sent) * 1000,
+        'fill_skew_ms': abs(satori_ack - orderly_ack) * 1000,
+        'satori_rtt_ms': (satori_ack - satori_sent) * 1000,
+        'orderly_rtt_ms': (orderly_ack - orderly_sent) * 1000,
+    }
+    registry.observe('pair fill_skew', latency['fill_skew_ms'] / 1000)
+    registry.observe('pair send_skew', latency['send_skew_ms'] / 1000)
+    emit(logger, 'pair_open', f'Задержка между ногами: {latency["fill_skew_ms"]:.1f} мс '
+                              f'(отправка {latency["send_skew_ms"]:.1f} мс)', token=token,
+         **{key: round(value, 3) for key, value in latency.items()})
+    return satori_order_id, satori_status, orderly_status, latency
+
+
+def close_pair(satori_bot, orderly_bot, token, orderly_pos):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        satori_close = pool.submit(satori_bot.close_market_position, token)
+        orderly_close = pool.submit(orderly_bot.close_market_position, token, orderly_pos)
+        return satori_close.result(), orderly_close.result()
+
+
+def set_tp_sl(satori_bot, orderly_bot, token, satori_pos, orderly_pos, at_entry=False):
+    entry = orderly_bot.entries.pop(token, None)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        orderly_tp_sl = pool.submit(orderly_bot.tp_sl, token, orderly_pos, *(entry if at_entry and entry else ()))
+        satori_tp_sl = pool.submit(satori_bot.tp_sl, token, satori_pos)
+        return orderly_tp_sl.result(), satori_tp_sl.result()
+
+
+def close_positions(satori_bot, orderly_bot, token, orderly_pos):
+    satori_close_status, orderly_close_status = close_pair(satori_bot, orderly_bot, token, orderly_pos)
+    return satori_close_status and orderly_close_status
+
+
+class TradeCycle(object):
+    def __init__(self, orderly_bot, satori_bot, tokens, tokens_probs, trade_amount_usd, needed_vol, satori_leverage,
+                 tp_sl_time, position_time, trade_pause_time, paired_execution=False, progress=None,
+                 max_open_pairs=1, journal=None, wallet='main', schedule=None, orderly_ws_url=None):
+        self.orderly_bot = orderly_bot
+        self.satori_bot = satori_bot
+        self.tokens = tokens
+        self.tokens_probs = tokens_probs
+        self.trade_amount_usd = trade_amount_usd
+        self.needed_vol = needed_vol
+        self.satori_leverage = satori_leverage
+        self.tp_sl_time = tp_sl_time
+        self.position_time = position_time
+        self.trade_pause_time = trade_pause_time
+        self.paired_execution = paired_execution
+        self.progress = progress
+        self.max_open_pairs = max_open_pairs
+        self.journal = journal
+        self.wallet = wallet
+        self._schedule = list(schedule or [])
+        self.vol = 0
+        self._live_tokens = set()
+        self._lock = threading.Lock()
+        self._scheduler = Scheduler(workers=max_open_pairs)
+        self._breakers = {'orderly': breaker('orderly'), 'satori': breaker('satori')}
+        self._failed_opens = 0
+        self._open_pairs = set()
+        self._hedge = HedgeMonitor(orderly_bot, satori_bot, hedge_poll_interval, orderly_ws_url)
+
+    def _add_volume(self, amount_usd):
+        with self._lock:
+            self.vol += amount_usd
+        if self.progress is not None:
+            self.progress(amount_usd)
+
+    def _record(self, pair_id, step, sync=False, **data):
+        if self.journal is None:
+            return True
+        self.journal.record(self.wallet, pair_id, step, **data)
+        if not sync:
+            return True
+        try:
+            if self.journal.flush(journal_flush_timeout):
+                return True
+            logger.error(f'Журнал не записан за {journal_flush_timeout} сек')
+        except Exception as e:
+            logger.error(f'Ошибка записи журнала: {e}')
+        return False
+
+    def _release(self, token):
+        with self._lock:
+            self._live_tokens.discard(token)
+
+    def _next_pause(self, trade):
+        if trade is not None:
+            return trade.pause
+        return random.randint(self.trade_pause_time[0], self.trade_pause_time[1])
+
+    def _paused_for(self):
+        return max(venue.retry_in() for venue in self._breakers.values())
+
+    def _report(self, **statuses):
+        for venue, ok in statuses.items():
+            if ok is None:
+                continue
+            if ok:
+                self._breakers[venue].success()
+            else:
+                self._breakers[venue].failure()
+
+    def _reopen_delay(self, trade):
+        pause = self._next_pause(trade)
+        if not self._failed_opens:
+            return pause
+        return max(pause, min(unwind_retry_delay * 2 ** self._failed_opens, open_backoff_max))
+
+    def _open_legs(self, token, satori_pos):
+        self.orderly_bot.positions.invalidate()
+        self.satori_bot.positions.invalidate()
+        return (self.orderly_bot.get_position_info(token)[1] != 0,
+                self.satori_bot.get_position(token, satori_pos) is not None)
+
+    def _close_remaining(self, pair):
+        token, satori_pos, orderly_pos = pair[:3]
+        try:
+            orderly_open, satori_open = self._open_legs(token, satori_pos)
+            if orderly_open:
+                self.orderly_bot.close_market_position(token, orderly_pos)
+            if satori_open:
+                self.satori_bot.close_market_position(token)
+            if orderly_open or satori_open:
+                orderly_left, satori_left = self._open_legs(token, satori_pos)
+                self._report(orderly=not orderly_left if orderly_open else None,
+                             satori=not satori_left if satori_open else None)
+                orderly_open, satori_open = orderly_left, satori_left
+        except Exception as e:
+            logger.error(f'Не удалось проверить позиции {token}: {e}')
+            return False
+        return not orderly_open and not satori_open
+
+    def _claim(self, pair_id):
+        with self._lock:
+            if pair_id not in self._open_pairs:
+                return False
+            self._open_pairs.discard(pair_id)
+            return True
+
+    def _watch(self, pair):
+        self._hedge.watch(pair[5], pair[0], pair[1], lambda detected, survivor: self._scheduler.call_later(
+            0, self._flatten_broken, pair, detected, survivor))
+
+    def _unwind(self, pair, reopen=True):
+        token, pair_id, trade = pair[0], pair[5], pair[6]
+        if not self._close_remaining(pair):
+            logger.error(f'Не удалось закрыть оставшиеся ноги {token}, повтор через {unwind_retry_delay} сек')
+            self._scheduler.call_later(unwind_retry_delay, self._unwind, pair, reopen)
+            return
+        self._record(pair_id, CLOSE, counted=False, reconciled=True)
+        self._release(token)
+        if reopen:
+            delay = self._reopen_delay(trade)
+            if self._failed_opens > 1:
+                logger.warning(f'{self._failed_opens} неудачных открытий подряд, следующая сделка через {delay} сек')
+            self._scheduler.call_later(delay, self.open_pair)
+
+    def _pick_token(self):
+        with self._lock:
+            free = [(t, p) for t, p in zip(self.tokens, self.tokens_probs) if t not in self._live_tokens]
+            if not free:
+                return None
+            token = random.choices([t for t, _ in free], [p for _, p in free], k=1)[0]
+            self._live_tokens.add(token)
+            return token
+
+    def _next_scheduled(self):
+        with self._lock:
+            for index, trade in enumerate(self._schedule):
+                if trade.token not in self._live_tokens:
+                    self._live_tokens.add(trade.token)
+                    return self._schedule.pop(index)
+        return None
+
+    def _plan_trade(self):
+        if self._schedule:
+            trade = self._next_scheduled()
+            if trade is not None:
+                return trade
+        token = self._pick_token()
+        if token is None:
+            return None
+        return PlannedTrade(token, random.randint(self.trade_amount_usd[0], self.trade_amount_usd[1]),
+                            random.choice([True, False]), random.randint(self.tp_sl_time[0], self.tp_sl_time[1]),
+                            random.randint(self.position_time[0], self.position_time[1]),
+                            random.randint(self.trade_pause_time[0], self.trade_pause_time[1]))
+
+    def presign(self, trade):
+        self.satori_bot.presign_open_market_position(trade.token, trade.satori_pos, trade.amount_usd)
+
+    def open_pair(self, trade=None):
+        if self.vol >= self.needed_vol:
+            if trade is not None:
+                self._release(trade.token)
+            return
+        if trade is None:
+            trade = self._plan_trade()
+        if trade is None:
+            self._scheduler.call_later(self.trade_pause_time[0], self.open_pair)
+            return
+        paused = self._paused_for()
+        if paused:
+            logger.info(f'Новые сделки приостановлены на {paused:.0f} сек')
+            self._scheduler.call_later(paused, self.open_pair, trade)
+            return
+        token, amount_usd, satori_pos = trade.token, trade.amount_usd, trade.satori_pos
         orderly_pos = not satori_pos
 
-        check_satori_balance(satori_bot, token, amount_usd, satori_leverage)
+        try:
+            balance = check_satori_balance(self.satori_bot, token, amount_usd, self.satori_leverage)
+        except Exception as e:
+            logger.error(f'Не удалось проверить баланс Satori: {e}')
+            balance = None
+        if balance is None:
+            self._scheduler.call_later(self._next_pause(trade), self.open_pair, trade)
+            return
 
-        satori_order_id, satori_status, orderly_status = open_positions(
-            satori_bot, orderly_bot, token, satori_pos, orderly_pos, amount_usd)
+        pair_id = uuid.uuid4().hex
+        if not self._record(pair_id, OPENING, sync=True, token=token, satori_pos=satori_pos, orderly_pos=orderly_pos,
+                            amount_usd=amount_usd):
+            logger.error(f'Открытие {token} не сохранено в журнале, сделка отложена')
+            self._scheduler.call_later(self._next_pause(trade), self.open_pair, trade)
+            return
+        if self.paired_execution:
+            satori_order_id, satori_status, orderly_status, _ = open_positions_paired(
+                self.satori_bot, self.orderly_bot, token, satori_pos, orderly_pos, amount_usd)
+        else:
+            satori_order_id, satori_status, orderly_status = open_positions(
+                self.satori_bot, self.orderly_bot, token, satori_pos, orderly_pos, amount_usd)
 
-        if not orderly_status:
-            sys.exit()
+        pair = (token, satori_pos, orderly_pos, satori_order_id, amount_usd, pair_id, trade)
+        self._report(satori=satori_status, orderly=orderly_status)
+        if not satori_status or not orderly_status:
+            logger.error(f'Пара {token} открыта не полностью, закрываем открывшиеся ноги')
+            with self._lock:
+                self._failed_opens += 1
+            self._unwind(pair)
+            return
 
-        vol += amount_usd
+        with self._lock:
+            self._failed_opens = 0
+            self._open_pairs.add(pair_id)
+        self._add_volume(amount_usd)
 
-        tp_sl_delay = random.randint(tp_sl_time[0], tp_sl_time[1])
-        logger.info(f'\nЖдем {tp_sl_delay} сек перед установкой TP/SL\n')
-        time.sleep(tp_sl_delay)
+        if protect_on_entry:
+            self._record(pair_id, OPEN, satori_order_id=satori_order_id, tp_sl_at=time.time())
+            self.protect_pair(pair, at_entry=True)
+            return
+        tp_sl_delay = trade.tp_sl_delay
+        self._record(pair_id, OPEN, satori_order_id=satori_order_id, tp_sl_at=time.time() + tp_sl_delay)
+        logger.info(f'\nЖдем {tp_sl_delay} сек перед установкой TP/SL {token}\n')
+        self._scheduler.call_later(tp_sl_delay, self.protect_pair, pair)
 
-        set_tp_sl(satori_bot, orderly_bot, token, satori_pos, orderly_pos)
+    def protect_pair(self, pair, at_entry=False):
+        token, satori_pos, orderly_pos, _, _, pair_id, trade = pair
+        started = time.perf_counter()
+        orderly_protected, satori_protected = set_tp_sl(self.satori_bot, self.orderly_bot, token, satori_pos,
+                                                        orderly_pos, at_entry)
+        self._report(orderly=orderly_protected, satori=satori_protected)
+        if not orderly_protected or not satori_protected:
+            logger.error(f'Не удалось установить TP/SL {token}, закрываем позиции')
+            self.close_pair(pair)
+            return
+        protected = time.perf_counter() - started
+        registry.observe('pair protect', protected)
+        self._watch(pair)
+        emit(logger, 'pair_protected', f'TP/SL {token} установлены на обеих площадках за {protected * 1000:.0f} мс',
+             token=token, pair_id=pair_id, latency_ms=round(protected * 1000, 3))
 
-        position_delay = random.randint(position_time[0], position_time[1])
-        logger.info(f'\nЖдем {position_delay / 60} минут перед закрытием позиций\n')
-        time.sleep(position_delay)
+        if trade is not None:
+            position_delay = trade.position_delay + (trade.tp_sl_delay if at_entry else 0)
+        else:
+            position_delay = random.randint(self.position_time[0], self.position_time[1])
+        self._record(pair_id, PROTECT, close_at=time.time() + position_delay)
+        logger.info(f'\nЖдем {position_delay / 60} минут перед закрытием позиций {token}\n')
+        self._scheduler.call_later(position_delay, self.close_pair, pair)
 
-        close_positions(satori_bot, orderly_bot, token, satori_order_id, orderly_pos)
+    def close_pair(self, pair):
+        if not self._claim(pair[5]):
+            return
+        self._hedge.unwatch(pair[5])
+        self._close(pair)
 
-        vol += amount_usd
-        pause = random.randint(trade_pause_time[0], trade_pause_time[1])
-        logger.info(f'\nЖдем {pause / 60} минут перед следующей сделкой\nТекущий объем: {vol}/{needed_vol}\n')
-        time.sleep(pause)
+    def _flatten_broken(self, pair, detected, survivor):
+        if not self._claim(pair[5]):
+            return
+        if survivor is None:
+            self._finish(pair)
+            return
+        if self._close(pair, survivor):
+            flattened = time.perf_counter() - detected
+            registry.observe('hedge flatten', flattened)
+            emit(logger, 'hedge_flattened', f'Оставшаяся нога {pair[0]} закрыта через {flattened * 1000:.0f} мс '
+                                            f'после обнаружения', token=pair[0], pair_id=pair[5],
+                 latency_ms=round(flattened * 1000, 3))
+
+    def _close(self, pair, survivor=None, retry=False):
+        token, orderly_pos = pair[0], pair[2]
+        if retry:
+            closed = False
+        elif survivor == 'orderly':
+            closed = self.orderly_bot.close_market_position(token, orderly_pos)
+            self._report(orderly=closed or None)
+        elif survivor == 'satori':
+            closed = self.satori_bot.close_market_position(token)
+            self._report(satori=closed or None)
+        else:
+            satori_closed, orderly_closed = close_pair(self.satori_bot, self.orderly_bot, token, orderly_pos)
+            self._report(satori=satori_closed or None, orderly=orderly_closed or None)
+            closed = satori_closed and orderly_closed
+        if not closed and not self._close_remaining(pair):
+            logger.error(f'Пара {token} закрыта не полностью, повтор через {unwind_retry_delay} сек')
+            self._scheduler.call_later(unwind_retry_delay, self._close, pair, survivor, True)
+            return False
+        self._finish(pair)
+        return True
+
+    def _finish(self, pair):
+        token, amount_usd, pair_id, trade = pair[0], pair[4], pair[5], pair[6]
+        self._record(pair_id, CLOSE)
+        self._release(token)
+
+        self._add_volume(amount_usd)
+        pause = self._next_pause(trade)
+        logger.info(f'\nЖдем {pause / 60} минут перед следующей сделкой\nТекущий объем: {self.vol}/{self.needed_vol}\n')
+        trade = self._plan_trade() if self.vol < self.needed_vol else None
+        if trade is not None:
+            self._scheduler.call_later(max(0, pause - presign_lead_time), self.presign, trade)
+        self._scheduler.call_later(pause, self.open_pair, trade)
+
+    def _resume(self):
+        vol, pairs = self.journal.replay(self.wallet)
+        self.vol = vol
+        if vol and self.progress is not None:
+            self.progress(vol)
+        resumed = 0
+        now = time.time()
+        for pair_id, state in pairs.items():
+            token, satori_pos, orderly_pos = state['token'], state['satori_pos'], state['orderly_pos']
+            try:
+                orderly_open, satori_open = self._open_legs(token, satori_pos)
+            except Exception as e:
+                logger.error(f'Не удалось проверить позиции {token}: {e}')
+                orderly_open = satori_open = False
+            pair = (token, satori_pos, orderly_pos, state.get('satori_order_id'), state['amount_usd'], pair_id, None)
+            with self._lock:
+                self._live_tokens.add(token)
+            if state['step'] != OPENING and orderly_open and satori_open:
+                with self._lock:
+                    self._open_pairs.add(pair_id)
+                if state['step'] == OPEN:
+                    self._scheduler.call_later(max(0, state['tp_sl_at'] - now), self.protect_pair, pair)
+                else:
+                    self._watch(pair)
+                    self._scheduler.call_later(max(0, state['close_at'] - now), self.close_pair, pair)
+                resumed += 1
+                logger.info(f'Восстановлена пара {token} ({state["step"]})')
+                continue
+            logger.info(f'Пара {token} ({state["step"]}) была открыта не полностью, закрываем оставшиеся ноги')
+            self._unwind(pair, reopen=False)
+        logger.info(f'Журнал восстановлен: объем {vol}, активных пар {resumed}')
+        return resumed
+
+    def run(self):
+        resumed = self._resume() if self.journal is not None else 0
+        slots = max(0, self.max_open_pairs - resumed)
+        stagger = self.trade_pause_time[0] / max(1, slots)
+        for slot in range(slots):
+            self._scheduler.call_later(slot * stagger, self.open_pair)
+        self._scheduler.run()
+        return self.vol
+
+
+def trade_cycle(orderly_bot, satori_bot, tokens, tokens_probs, trade_amount_usd, needed_vol, satori_leverage,
+                tp_sl_time, position_time, trade_pause_time, paired_execution=False, progress=None,
+                max_open_pairs=1, journal=None, wallet='main', schedule=None, orderly_ws_url=None):
+    cycle = TradeCycle(orderly_bot, satori_bot, tokens, tokens_probs, trade_amount_usd, needed_vol, satori_leverage,
+                       tp_sl_time, position_time, trade_pause_time, paired_execution, progress, max_open_pairs,
+                       journal, wallet, schedule, orderly_ws_url)
+    return cycle.run()
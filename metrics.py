@@ -0,0 +1,182 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+EXPORT_BOUNDS_US = (500, 1_000, 2_500, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000, 500_000,
+                    1_000_000, 2_500_000, 5_000_000, 10_000_000)
+
+
+def _bucket_index(value_us: int) -> int:
+    if value_us < SUB_BUCKETS:
+        return value_us
+    shift = value_us.bit_length() - SUB_BUCKET_BITS - 1
+    return ((shift + 1) << SUB_BUCKET_BITS) + ((value_us >> shift) - SUB_BUCKETS)
+
+
+def _bucket_upper(index: int) -> int:
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index >> SUB_BUCKET_BITS) - 1
+    return ((SUB_BUCKETS + (index & (SUB_BUCKETS - 1)) + 1) << shift) - 1
+
+
+class Histogram(object):
+    def __init__(self):
+        self._counts = {}
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+        self._lock = threading.Lock()
+
+    def record(self, value_us: int):
+        index = _bucket_index(value_us)
+        with self._lock:
+            self._counts[index] = self._counts.get(index, 0) + 1
+            self.count += 1
+            self.total_us += value_us
+            if value_us > self.max_us:
+                self.max_us = value_us
+
+    def snapshot(self):
+        with self._lock:
+            return sorted(self._counts.items()), self.count, self.total_us, self.max_us
+
+    def quantile(self, q: float) -> int:
+        buckets, count, _, max_us = self.snapshot()
+        if not count:
+            return 0
+        rank = q * count
+        seen = 0
+        for index, bucket_count in buckets:
+            seen += bucket_count
+            if seen >= rank:
+                return min(_bucket_upper(index), max_us)
+        return max_us
+
+
+class Registry(object):
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name: str, seconds: float):
+        self.histogram(name).record(int(seconds * 1_000_000))
+
+    def inc(self, name: str, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set(self, name: str, value):
+        self._gauges[name] = value
+
+    def render_prometheus(self) -> str:
+        lines = ['# TYPE bot_span_seconds histogram']
+        for name, histogram in sorted(self._histograms.items()):
+            buckets, count, total_us, _ = histogram.snapshot()
+            label = name.replace('\\', '\\\\').replace('"', '\\"')
+            cumulative = 0
+            position = 0
+            for bound in EXPORT_BOUNDS_US:
+                while position < len(buckets) and _bucket_upper(buckets[position][0]) <= bound:
+                    cumulative += buckets[position][1]
+                    position += 1
+                lines.append(f'bot_span_seconds_bucket{{span="{label}",le="{bound / 1e6}"}} {cumulative}')
+            lines.append(f'bot_span_seconds_bucket{{span="{label}",le="+Inf"}} {count}')
+            lines.append(f'bot_span_seconds_sum{{span="{label}"}} {total_us / 1e6}')
+            lines.append(f'bot_span_seconds_count{{span="{label}"}} {count}')
+        lines.append('# TYPE bot_events_total counter')
+        for name, value in sorted(self._counters.items()):
+            lines.append(f'bot_events_total{{event="{name}"}} {value}')
+        lines.append('# TYPE bot_gauge gauge')
+        for name, value in sorted(self._gauges.items()):
+            lines.append(f'bot_gauge{{name="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        lines = []
+        for name, histogram in sorted(self._histograms.items()):
+            if not histogram.count:
+                continue
+            lines.append(f'{name}: n={histogram.count} p50={histogram.quantile(0.5) / 1000:.1f}мс '
+                         f'p99={histogram.quantile(0.99) / 1000:.1f}мс max={histogram.max_us / 1000:.1f}мс')
+        for name, value in sorted(self._counters.items()):
+            lines.append(f'{name}: {value}')
+        return '\n'.join(lines)
+
+
+registry = Registry()
+
+
+@contextmanager
+def span(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.perf_counter() - started)
+
+
+def timed(name: str):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int, host='127.0.0.1'):
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.error(f'Не удалось открыть порт метрик {host}:{port}, метрики только в логе: {e}')
+        return None
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f'Метрики доступны на http://{host}:{port}/metrics')
+    return server
+
+
+def log_summary_every(interval: float):
+    def _run():
+        while True:
+            time.sleep(interval)
+            summary = registry.summary()
+            if summary:
+                logger.info(f'\nМетрики:\n{summary}\n')
+    threading.Thread(target=_run, name='metrics-summary', daemon=True).start()
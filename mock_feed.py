@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+from aiohttp import web, WSMsgType
+
+start_prices = {'ETH': 3000.0, 'OP': 2.5, 'ARB': 1.0, 'SOL': 150.0, 'APT': 8.0, 'SUI': 1.0, 'BNB': 600.0,
+                'STRK': 1.2}
+
+
+async def _push(ws, topics, prices, interval):
+    while not ws.closed:
+        for topic in list(topics):
+            symbol = topic.split('@')[0]
+            token = symbol.split('_')[1]
+            prices[token] *= 1 + random.gauss(0, 0.0005)
+            await ws.send_json({'topic': topic, 'ts': int(time.time() * 1000),
+                                'data': {'symbol': symbol, 'price': round(prices[token], 6)}})
+        await ws.send_json({'event': 'ping', 'ts': int(time.time() * 1000)})
+        await asyncio.sleep(interval)
+
+
+async def stream(request):
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    topics = set()
+    prices = dict(start_prices)
+    pusher = asyncio.ensure_future(_push(ws, topics, prices, request.app['interval']))
+    try:
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                break
+            message = json.loads(msg.data)
+            if message.get('event') == 'subscribe':
+                topics.add(message['topic'])
+                await ws.send_json({'id': message.get('id'), 'event': 'subscribe', 'success': True,
+                                    'ts': int(time.time() * 1000)})
+    finally:
+        pusher.cancel()
+    return ws
+
+
+def create_app(interval=0.2):
+    app = web.Application()
+    app['interval'] = interval
+    app.router.add_get('/ws/stream/{account_id}', stream)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--interval', type=float, default=0.2)
+    args = parser.parse_args()
+    web.run_app(create_app(args.interval), port=args.port)
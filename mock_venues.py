@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import random
+import threading
+import time
+from aiohttp import web
+
+prices = {'ETH': 3000.0, 'OP': 2.5, 'ARB': 1.0, 'SOL': 150.0, 'APT': 8.0, 'SUI': 1.0, 'BNB': 600.0, 'STRK': 1.2}
+satori_pairs = {1: 'ETH', 13: 'OP', 9: 'ARB', 6: 'SOL'}
+lot_sizes = {'ETH': 0.0001, 'OP': 0.1, 'ARB': 1, 'SOL': 0.01, 'APT': 0.1, 'SUI': 1, 'BNB': 0.001, 'STRK': 0.1}
+
+
+class Faults(object):
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, fill_slippage=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fill_slippage = fill_slippage
+        self.routes = {}
+
+    def for_route(self, route):
+        return self.routes.get(route, self)
+
+    async def delay(self, route):
+        faults = self.for_route(route)
+        pause = faults.latency + random.uniform(0, faults.jitter)
+        if pause > 0:
+            await asyncio.sleep(pause)
+        return random.random() < faults.error_rate
+
+    def fill_price(self, token):
+        price = prices[token]
+        return price * (1 + random.uniform(-self.fill_slippage, self.fill_slippage))
+
+
+def _route(faults, name):
+    def decorator(handler):
+        async def wrapper(request):
+            if await faults.delay(name):
+                return web.json_response({'success': False, 'msg': 'MOCK_ERROR', 'code': -1}, status=500)
+            return await handler(request)
+        return wrapper
+    return decorator
+
+
+def create_orderly_app(faults: Faults):
+    app = web.Application()
+    positions = {}
+    app['positions'] = positions
+    counter = {'order_id': 0}
+
+    def apply_fill(symbol, side, qty, reduce_only):
+        token = symbol.split('_')[1]
+        position = positions.setdefault(symbol, {'symbol': symbol, 'position_qty': 0.0, 'average_open_price': 0.0})
+        signed = qty if side == 'BUY' else -qty
+        if reduce_only:
+            signed = max(-abs(position['position_qty']), min(abs(position['position_qty']), signed))
+        price = faults.fill_price(token)
+        new_qty = position['position_qty'] + signed
+        if position['position_qty'] == 0 or (position['position_qty'] > 0) == (signed > 0):
+            total = abs(position['position_qty']) + abs(signed)
+            if total:
+                position['average_open_price'] = (position['average_open_price'] * abs(position['position_qty'])
+                                                  + price * abs(signed)) / total
+        position['position_qty'] = round(new_qty, 8)
+        if position['position_qty'] == 0:
+            positions.pop(symbol)
+
+    @_route(faults, 'orderly.order')
+    async def order(request):
+        body = await request.json()
+        apply_fill(body['symbol'], body['side'], float(body['order_quantity']), body.get('reduce_only', False))
+        counter['order_id'] += 1
+        return web.json_response({'success': True, 'data': {'order_id': counter['order_id'],
+                                                            'client_order_id': body.get('client_order_id')}})
+
+    @_route(faults, 'orderly.batch_order')
+    async def batch_order(request):
+        body = await request.json()
+        rows = []
+        for item in body['orders']:
+            apply_fill(item['symbol'], item['side'], float(item['order_quantity']), item.get('reduce_only', False))
+            counter['order_id'] += 1
+            rows.append({'order_id': counter['order_id'], 'client_order_id': item.get('client_order_id')})
+        return web.json_response({'success': True, 'data': {'rows': rows}})
+
+    @_route(faults, 'orderly.algo_order')
+    async def algo_order(request):
+        await request.json()
+        counter['order_id'] += 1
+        return web.json_response({'success': True, 'data': {'rows': [{'order_id': counter['order_id']}]}})
+
+    @_route(faults, 'orderly.positions')
+    async def all_positions(request):
+        return web.json_response({'success': True, 'data': {'rows': list(positions.values())}})
+
+    @_route(faults, 'orderly.position')
+    async def position(request):
+        symbol = request.match_info['symbol']
+        row = positions.get(symbol, {'symbol': symbol, 'position_qty': 0.0, 'average_open_price': 0.0})
+        return web.json_response({'success': True, 'data': row})
+
+    @_route(faults, 'orderly.futures')
+    async def futures(request):
+        token = request.match_info['symbol'].split('_')[1]
+        return web.json_response({'success': True, 'data': {'index_price': prices[token], 'mark_price': prices[token]}})
+
+    @_route(faults, 'orderly.info')
+    async def info(request):
+        rows = [{'symbol': f'PERP_{token}_USDC', 'base_tick': lot_sizes[token], 'quote_tick': 0.001,
+                 'base_min': lot_sizes[token], 'min_notional': 1} for token in prices]
+        return web.json_response({'success': True, 'data': {'rows': rows}})
+
+    app.router.add_post('/v1/order', order)
+    app.router.add_post('/v1/batch-order', batch_order)
+    app.router.add_post('/v1/algo/order', algo_order)
+    app.router.add_get('/v1/positions', all_positions)
+    app.router.add_get('/v1/position/{symbol}', position)
+    app.router.add_get('/v1/public/futures/{symbol}', futures)
+    app.router.add_get('/v1/public/info', info)
+    return app
+
+
+def create_satori_app(faults: Faults):
+    app = web.Application()
+    positions = {}
+    app['positions'] = positions
+    counter = {'position_id': 0}
+
+    def ok(data=None):
+        return web.json_response({'msg': 'SUCCESS', 'code': 200, 'data': data})
+
+    @_route(faults, 'satori.nonce')
+    async def nonce(request):
+        return ok({'nonce': str(random.getrandbits(64))})
+
+    @_route(faults, 'satori.token')
+    async def token(request):
+        return ok('mock-token-%d' % random.getrandbits(32))
+
+    @_route(faults, 'satori.time')
+    async def server_time(request):
+        return ok(int(time.time() * 1000))
+
+    @_route(faults, 'satori.kline')
+    async def kline(request):
+        body = await request.json()
+        price = prices[satori_pairs[body['contractPairId']]]
+        return ok([{'open': price, 'high': price, 'low': price, 'close': price, 'time': body.get('endTime')}])
+
+    @_route(faults, 'satori.overview')
+    async def overview(request):
+        return ok({'availableAmount': '100000'})
+
+    @_route(faults, 'satori.open')
+    async def open_position(request):
+        body = await request.json()
+        counter['position_id'] += 1
+        pair_id = body['contractPairId']
+        positions[counter['position_id']] = {
+            'id': counter['position_id'],
+            'contractPairId': pair_id,
+            'isLong': body['isLong'],
+            'quantity': body['quantity'],
+            'openingPrice': str(faults.fill_price(satori_pairs[pair_id])),
+        }
+        return ok({'id': counter['position_id'], 'clientOrderId': body['clientOrderId']})
+
+    @_route(faults, 'satori.close')
+    async def close_position(request):
+        body = await request.json()
+        if positions.pop(body['contractPositionId'], None) is None:
+            return web.json_response({'msg': 'POSITION_NOT_FOUND', 'code': 500, 'data': None})
+        return ok()
+
+    @_route(faults, 'satori.positions')
+    async def position_list(request):
+        body = await request.json()
+        records = list(positions.values())[:body.get('pageSize', 10)]
+        return ok({'records': records, 'total': len(positions)})
+
+    @_route(faults, 'satori.stop_config')
+    async def stop_config(request):
+        body = await request.json()
+        if body['id'] not in positions:
+            return web.json_response({'msg': 'POSITION_NOT_FOUND', 'code': 500, 'data': None})
+        return ok()
+
+    @_route(faults, 'satori.pairs')
+    async def pair_list(request):
+        return ok([{'id': pair_id, 'quantityPrecision': 3 if token == 'ETH' else 1, 'pricePrecision': 3,
+                    'minQuantity': 0} for pair_id, token in satori_pairs.items()])
+
+    api = '/api'
+    app.router.add_post(api + '/auth/auth/generateNonce', nonce)
+    app.router.add_post(api + '/auth/auth/token', token)
+    app.router.add_get(api + '/third/info/time', server_time)
+    app.router.add_post(api + '/contract-quotes-provider/contract-quotes/selectKlinePillarList', kline)
+    app.router.add_post(api + '/contract-provider/contract-account/overview/4', overview)
+    app.router.add_post(api + '/contract-provider/contract/order/openPosition', open_position)
+    app.router.add_post(api + '/contract-provider/contract/order/closePosition', close_position)
+    app.router.add_post(api + '/contract-provider/contract/selectContractPositionList', position_list)
+    app.router.add_post(api + '/contract-provider/contract/updateStopConfig', stop_config)
+    app.router.add_get(api + '/contract-provider/contract-pair/list', pair_list)
+    return app
+
+
+class MockVenues(object):
+    def __init__(self, faults: Faults = None, orderly_port=0, satori_port=0, host='127.0.0.1'):
+        self.faults = faults or Faults()
+        self._host = host
+        self._ports = {'orderly': orderly_port, 'satori': satori_port}
+        self._loop = None
+        self._runners = []
+        self.orderly_url = None
+        self.satori_url = None
+        self.orderly_app = None
+        self.satori_app = None
+
+    async def _start(self):
+        self.orderly_app = create_orderly_app(self.faults)
+        self.satori_app = create_satori_app(self.faults)
+        for name, app in (('orderly', self.orderly_app), ('satori', self.satori_app)):
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, self._host, self._ports[name])
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            setattr(self, f'{name}_url', f'http://{self._host}:{port}')
+            self._runners.append(runner)
+
+    def start(self):
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name='mock-venues', daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    def stop(self):
+        async def _cleanup():
+            for runner in self._runners:
+                await runner.cleanup()
+        asyncio.run_coroutine_threadsafe(_cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orderly-port', type=int, default=8801)
+    parser.add_argument('--satori-port', type=int, default=8802)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    venues = MockVenues(Faults(args.latency, args.jitter, args.error_rate), args.orderly_port, args.satori_port)
+    venues.start()
+    print(f'Orderly: {venues.orderly_url}\nSatori: {venues.satori_url}')
+    threading.Event().wait()
@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functions import generate_random_string
+
+logger = logging.getLogger(__name__)
+
+
+class OrderIdRegistry(object):
+    def __init__(self, path='satori_orders.db', legacy_json='satori_orders_ids.json'):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS order_ids (id TEXT PRIMARY KEY, created INTEGER NOT NULL)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        if legacy_json:
+            self._migrate(legacy_json)
+        self._ids = {row[0] for row in self._conn.execute('SELECT id FROM order_ids')}
+
+    def _migrate(self, legacy_json):
+        if not os.path.exists(legacy_json):
+            return
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+            if done:
+                return
+            with open(legacy_json, 'r') as file:
+                legacy_ids = json.load(file)['orders']
+            now = int(time.time())
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._conn.executemany('INSERT OR IGNORE INTO order_ids (id, created) VALUES (?, ?)',
+                                   ((order_id, now) for order_id in legacy_ids))
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)",
+                               (legacy_json,))
+            self._conn.execute('COMMIT')
+        logger.info(f'Перенесено {len(legacy_ids)} номеров ордеров из {legacy_json}')
+
+    def __contains__(self, order_id):
+        return order_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def generate(self, length=21):
+        while True:
+            order_id = generate_random_string(length)
+            if order_id in self._ids:
+                continue
+            with self._lock:
+                inserted = self._conn.execute('INSERT OR IGNORE INTO order_ids (id, created) VALUES (?, ?)',
+                                              (order_id, int(time.time()))).rowcount
+                self._ids.add(order_id)
+            if inserted:
+                return order_id
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_registry():
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = OrderIdRegistry()
+        return _default
@@ -1,132 +1,298 @@
 import logging
 from base64 import urlsafe_b64encode
-from datetime import datetime
+from functools import lru_cache
 import json
-import math
-from base58 import b58decode
-from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+import threading
+import time
+import uuid
 from requests import PreparedRequest, Request
-import urllib
-from functions import get_orderly_token_price, create_session_orderly, encode_key
-from config import orderly_tokens, tp_sl_percentage
+from urllib.parse import urlsplit
+from functions import get_orderly_token_price, encode_key
+from transport import create_session
+from metrics import timed
+from events import emit
+from positions import PositionBook
+from resilience import retry, raise_for_transient, ORDER_ERRORS
+from ratelimit import lane, current_lane, HIGH, LOW
+from symbols import registry as symbol_registry
+from config import tp_sl_percentage, position_cache_ttl, orderly_base_url, orderly_batch_window
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=256)
+def _split_url(url: str):
+    parts = urlsplit(url)
+    suffix = ("?" + parts.query).encode() if parts.query else b""
+    return parts.path.encode(), suffix
+
+
+class OrderlySigner(object):
+    def __init__(self, account_id: str, private_key) -> None:
+        self._private_key = private_key
+        static = {
+            'origin': 'https://pro.logx.trade',
+            'referer': 'https://pro.logx.trade/',
+            "orderly-account-id": account_id,
+            "orderly-key": encode_key(private_key.public_key().public_bytes_raw()),
+        }
+        self._headers = {
+            "GET": dict(static, **{"Content-Type": "application/x-www-form-urlencoded"}),
+            "DELETE": dict(static, **{"Content-Type": "application/x-www-form-urlencoded"}),
+            "POST": dict(static, **{"Content-Type": "application/json"}),
+            "PUT": dict(static, **{"Content-Type": "application/json"}),
+        }
+
+    @timed('orderly sign')
+    def sign(self, method: str, url: str, body=None) -> PreparedRequest:
+        timestamp = str(time.time_ns() // 1_000_000)
+        data = json.dumps(body, separators=(",", ":")).encode() if body is not None else b""
+        path, query = _split_url(url)
+        message = timestamp.encode() + method.encode() + path + data + query
+        headers = dict(self._headers[method])
+        headers["orderly-timestamp"] = timestamp
+        headers["orderly-signature"] = urlsafe_b64encode(self._private_key.sign(message)).decode("utf-8")
+
+        prepared = PreparedRequest()
+        prepared.prepare(method=method, url=url, headers=headers, data=data or None)
+        return prepared
+
+    def ws_auth(self) -> dict:
+        timestamp = str(time.time_ns() // 1_000_000)
+        signature = urlsafe_b64encode(self._private_key.sign(timestamp.encode())).decode("utf-8")
+        return {'orderly_key': self._headers['GET']['orderly-key'], 'sign': signature, 'timestamp': timestamp}
+
+
+class OrderBatcher(object):
+    def __init__(self, send_one, send_batch, window=orderly_batch_window, max_size=10):
+        self._send_one = send_one
+        self._send_batch = send_batch
+        self._window = window
+        self._max_size = max_size
+        self._pending = []
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def submit(self, body: dict, req=None) -> dict:
+        if self._window <= 0 or current_lane() == HIGH:
+            return self._send_one(body, req)
+        slot = {'body': body, 'req': req, 'lane': current_lane(), 'done': threading.Event(), 'result': None,
+                'error': None}
+        with self._lock:
+            direct = not self._pending and not self._in_flight
+            if direct:
+                self._in_flight += 1
+            else:
+                self._pending.append(slot)
+            leader = len(self._pending) == 1
+        if direct:
+            try:
+                return self._send_one(body, req)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+        if leader:
+            time.sleep(self._window)
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._in_flight += 1
+            try:
+                for start in range(0, len(batch), self._max_size):
+                    self._flush(batch[start:start + self._max_size])
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+        slot['done'].wait()
+        if slot['error'] is not None:
+            raise slot['error']
+        return slot['result']
+
+    def _flush(self, chunk):
+        try:
+            with lane(min(slot['lane'] for slot in chunk)):
+                if len(chunk) == 1:
+                    results = [self._send_one(chunk[0]['body'], chunk[0]['req'])]
+                else:
+                    results = self._send_batch([slot['body'] for slot in chunk])
+            for slot, result in zip(chunk, results):
+                slot['result'] = result
+        except Exception as e:
+            for slot in chunk:
+                slot['error'] = e
+        finally:
+            for slot in chunk:
+                slot['done'].set()
+
+
 class OrderlyTrading(object):
     def __init__(
             self,
-            wallet: dict
+            wallet: dict,
+            prices=None,
+            limiter=None,
+            base_url=orderly_base_url
     ) -> None:
-        self._base_url = "https://api-evm.orderly.org"
+        self._base_url = base_url
         self._account_id = wallet['account_id']
+        from base58 import b58decode
+        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
         key = b58decode(wallet['orderly_secret'])
         self._private_key = Ed25519PrivateKey.from_private_bytes(key)
+        self._signer = OrderlySigner(self._account_id, self._private_key)
+        self._session = create_session(limiter=limiter, name='orderly')
+        self.prices = prices
+        self.positions = PositionBook(self._fetch_positions, 'symbol', 'symbol', ttl=position_cache_ttl)
+        self.entries = {}
+        self._batcher = OrderBatcher(self._post_order, self._post_batch)
+        self._symbols = None
 
-    def sign_request(self, req: Request) -> PreparedRequest:
-        d = datetime.utcnow()
-        epoch = datetime(1970, 1, 1)
-        timestamp = math.trunc((d - epoch).total_seconds() * 1_000)
-
-        json_str = ""
-        if req.json is not None:
-            json_str = json.dumps(req.json)
-
-        url = urllib.parse.urlparse(req.url)
-        message = str(timestamp) + req.method + url.path + json_str
-        if len(url.query) > 0:
-            message += "?" + url.query
-
-        orderly_signature = urlsafe_b64encode(
-            self._private_key.sign(message.encode())
-        ).decode("utf-8")
-        req.headers = {
-            'origin': 'https://pro.logx.trade',
-            'referer': 'https://pro.logx.trade/',
-            "orderly-timestamp": str(timestamp),
-            "orderly-account-id": self._account_id,
-            "orderly-key": encode_key(
-                self._private_key.public_key().public_bytes_raw()
-            ),
-            "orderly-signature": orderly_signature,
-        }
-        if req.method == "GET" or req.method == "DELETE":
-            req.headers["Content-Type"] = "application/x-www-form-urlencoded"
-        elif req.method == "POST" or req.method == "PUT":
-            req.headers["Content-Type"] = "application/json"
+    @property
+    def account_id(self) -> str:
+        return self._account_id
 
-        return req.prepare()
+    def ws_auth(self) -> dict:
+        return self._signer.ws_auth()
 
-    def open_market_position(self, token: str, long: bool, amount_usd: int) -> bool:
-        token_info = orderly_tokens[token]
+    def load_symbols(self) -> dict:
+        self._symbols = symbol_registry.venue('orderly', self._base_url)
+        return self._symbols
+
+    def symbol(self, token: str):
+        symbols = self._symbols if self._symbols is not None else self.load_symbols()
+        return symbols[token]
+
+    def sign_request(self, req: Request) -> PreparedRequest:
+        return self._signer.sign(req.method, req.url, req.json)
+
+    def prepare_market_order(self, token: str, long: bool, amount_usd: int):
+        symbol = self.symbol(token)
         try:
-            session = create_session_orderly()
             side = "BUY" if long else "SELL"
-            current_token_price = get_orderly_token_price(token)
-            if token in ['ARB', 'SUI']:
-                token_quantity = int(amount_usd / current_token_price)
+            if self.prices is not None:
+                current_token_price = self.prices.get('orderly', token)
             else:
-                token_quantity = round(amount_usd / float(current_token_price), token_info['decimals'])
-
-            req = self.sign_request(
-                Request(
-                    "POST",
-                    "%s/v1/order" % self._base_url,
-                    json={
-                        "symbol": f"PERP_{token}_USDC",
-                        "order_type": "MARKET",
-                        "order_quantity": token_quantity,
-                        "side": side,
-                    },
-                )
-            )
-            res = session.send(req)
-            response = json.loads(res.text)
+                current_token_price = get_orderly_token_price(token, self._base_url)
+            token_quantity = symbol.qty_for(amount_usd, current_token_price)
+            if token_quantity <= 0 or token_quantity < symbol.min_qty \
+                    or token_quantity * float(current_token_price) < symbol.min_notional:
+                logger.error(f'Объем {token_quantity} {token} меньше минимального на Orderly')
+                return None
+
+            body = {
+                "symbol": symbol.name,
+                "client_order_id": uuid.uuid4().hex,
+                "order_type": "MARKET",
+                "order_quantity": token_quantity,
+                "side": side,
+            }
+            req = self.sign_request(Request("POST", "%s/v1/order" % self._base_url, json=body))
+            return {'token': token, 'symbol': symbol, 'long': long, 'quantity': token_quantity,
+                    'price': float(current_token_price), 'body': body, 'request': req}
+        except Exception as e:
+            logger.error(f'Проблемы с подготовкой сделки на Orderly: {e}')
+            return None
+
+    def _post_order(self, body: dict, req=None) -> dict:
+        signed = iter([req] if req is not None else [])
+        url = "%s/v1/order" % self._base_url
+
+        def attempt():
+            res = self._session.send(next(signed, None) or self._signer.sign("POST", url, body))
+            raise_for_transient(res)
+            return json.loads(res.text)
+
+        return retry(attempt, 'orderly order', errors=ORDER_ERRORS)
+
+    def _post_batch(self, bodies: list) -> list:
+        url = "%s/v1/batch-order" % self._base_url
+
+        def attempt():
+            res = self._session.send(self._signer.sign("POST", url, {'orders': bodies}))
+            raise_for_transient(res)
+            return json.loads(res.text)
+
+        response = retry(attempt, 'orderly batch-order', errors=ORDER_ERRORS)
+        rows = {}
+        if response.get('success'):
+            rows = {row.get('client_order_id'): row for row in response['data']['rows']}
+        logger.info(f'{len(bodies)} ордеров Orderly отправлены одним batch-order')
+        return [{'success': True, 'data': rows[body['client_order_id']]} if body['client_order_id'] in rows
+                else {'success': False, 'data': response} for body in bodies]
+
+    def _send_order(self, body: dict, req=None) -> dict:
+        try:
+            return self._batcher.submit(body, req)
+        finally:
+            self.positions.invalidate()
+
+    @lane(LOW)
+    def send_market_order(self, order: dict) -> bool:
+        fields = {'venue': 'orderly', 'token': order['token'], 'side': order['body']['side'],
+                  'qty': order['quantity'], 'order_id': order['body']['client_order_id']}
+        try:
+            started = time.perf_counter()
+            response = self._send_order(order['body'], order['request'])
+            fields['latency_ms'] = round((time.perf_counter() - started) * 1000, 3)
             if response['success']:
-                pos = 'Лонг' if long else 'Шорт'
-                logger.info(f'Успешно открыта {pos} позиция на Orderly: {token_quantity} {token}')
+                self.entries[order['token']] = (order['price'], order['quantity'])
+                pos = 'Лонг' if order['long'] else 'Шорт'
+                emit(logger, 'order_open', f'Успешно открыта {pos} позиция на Orderly: {order["quantity"]} '
+                                           f'{order["token"]}', **fields)
                 return True
             else:
-                logger.error(response)
+                emit(logger, 'order_rejected', str(response), logging.ERROR, response=response, **fields)
                 return False
         except Exception as e:
             logger.error(f'Проблемы с открытием сделки на Orderly: {e}')
             return False
 
-    def get_position_info(self, token: str) -> [float, any]:
-        url = f"https://api-evm.orderly.network/v1/position/PERP_{token}_USDC"
-        session = create_session_orderly()
+    def open_market_position(self, token: str, long: bool, amount_usd: int) -> bool:
+        order = self.prepare_market_order(token, long, amount_usd)
+        if order is None:
+            return False
+        return self.send_market_order(order)
+
+    def _fetch_positions(self) -> list:
         req = self.sign_request(
             Request(
                 "GET",
-                url,
+                "%s/v1/positions" % self._base_url,
             )
         )
-        res = session.send(req)
-
+        res = self._session.send(req)
         response = json.loads(res.text)
-        average_open_price = response['data']['average_open_price']
-        position_qty = abs(response['data']['position_qty'])
-        if token == 'ARB':
-            position_qty = int(position_qty)
+        return [row for row in response['data']['rows'] if row['position_qty'] != 0]
+
+    def get_position_info(self, token: str) -> [float, any]:
+        symbol = self.symbol(token)
+        position = self.positions.get(symbol.name)
+        if position is None:
+            return 0.0, 0
+        average_open_price = position['average_open_price']
+        position_qty = symbol.round_qty(abs(position['position_qty']))
         return average_open_price, position_qty
 
-    def tp_sl(self, token: str, long: bool) -> bool:
-        token_info = orderly_tokens[token]
-        entry_price, position_qty = self.get_position_info(token)
-        tp_sl_url = 'https://api-evm.orderly.org/v1/algo/order'
+    @lane(HIGH)
+    def tp_sl(self, token: str, long: bool, entry_price=None, position_qty=None) -> bool:
+        symbol = self.symbol(token)
+        if entry_price is None or position_qty is None:
+            try:
+                entry_price, position_qty = self.get_position_info(token)
+            except Exception as e:
+                logger.error(f'Не удалось получить позицию {token} на Orderly: {e}')
+                return False
+        tp_sl_url = '%s/v1/algo/order' % self._base_url
         if long:
             side = "SELL"
-            lossPrice = round(entry_price - entry_price * tp_sl_percentage, token_info['tp_precision'])
-            profitPrice = round(entry_price + entry_price * tp_sl_percentage, token_info['tp_precision'])
+            lossPrice = symbol.round_price(entry_price - entry_price * tp_sl_percentage)
+            profitPrice = symbol.round_price(entry_price + entry_price * tp_sl_percentage)
         else:
             side = "BUY"
-            lossPrice = round(entry_price + entry_price * tp_sl_percentage, token_info['tp_precision'])
-            profitPrice = round(entry_price - entry_price * tp_sl_percentage, token_info['tp_precision'])
+            lossPrice = symbol.round_price(entry_price + entry_price * tp_sl_percentage)
+            profitPrice = symbol.round_price(entry_price - entry_price * tp_sl_percentage)
 
         json_data = {
-            'symbol': f'PERP_{token}_USDC',
+            'symbol': symbol.name,
             'algo_type': 'TP_SL',
             'quantity': position_qty,
             'trigger_price_type': 'MARK_PRICE',
@@ -134,7 +300,7 @@ class OrderlyTrading(object):
             'reduce_only': True,
             'child_orders': [
                 {
-                    'symbol': f'PERP_{token}_USDC',
+                    'symbol': symbol.name,
                     'algo_type': 'TAKE_PROFIT',
                     'side': side,
                     'type': 'MARKET',
@@ -142,7 +308,7 @@ class OrderlyTrading(object):
                     'reduce_only': True,
                 },
                 {
-                    'symbol': f'PERP_{token}_USDC',
+                    'symbol': symbol.name,
                     'algo_type': 'STOP_LOSS',
                     'side': side,
                     'type': 'MARKET',
@@ -151,56 +317,57 @@ class OrderlyTrading(object):
                 },
             ],
         }
-        session = create_session_orderly()
+
+        def attempt():
+            res = self._session.send(self._signer.sign("POST", tp_sl_url, json_data))
+            raise_for_transient(res)
+            return json.loads(res.text)
+
         try:
-            req = self.sign_request(
-                Request(
-                    "POST",
-                    tp_sl_url,
-                    json=json_data,
-                )
-            )
-            res = session.send(req)
-            response = json.loads(res.text)
+            started = time.perf_counter()
+            response = retry(attempt, 'orderly algo-order', errors=ORDER_ERRORS)
+            fields = {'venue': 'orderly', 'token': token, 'side': side, 'qty': position_qty, 'tp': profitPrice,
+                      'sl': lossPrice, 'latency_ms': round((time.perf_counter() - started) * 1000, 3)}
             if response['success']:
-                logger.info(f'Позиция Orderly: {token}\n'
-                            f'TP: {profitPrice}\n'
-                            f'SL: {lossPrice}\n')
+                emit(logger, 'tp_sl_set', f'Позиция Orderly: {token}\n'
+                                          f'TP: {profitPrice}\n'
+                                          f'SL: {lossPrice}\n', **fields)
                 return True
             else:
-                logger.error(response)
+                emit(logger, 'tp_sl_rejected', str(response), logging.ERROR, response=response, **fields)
                 return False
         except Exception as e:
             logger.error(f'Проблема с установкой TP/SL на Orderly: {e}')
             return False
 
+    @lane(HIGH)
     def close_market_position(self, token: str, long: bool) -> bool:
-        _, position_qty = self.get_position_info(token)
-        side = "SELL" if long else "BUY"
-        json_data = {
-            'symbol': f'PERP_{token}_USDC',
-            'order_type': 'MARKET',
-            'side': side,
-            'reduce_only': True,
-            'order_quantity': position_qty
-        }
-        session = create_session_orderly()
-        req = self.sign_request(
-            Request(
-                "POST",
-                "%s/v1/order" % self._base_url,
-                json=json_data,
-            )
-        )
         try:
-            res = session.send(req)
-            response = json.loads(res.text)
+            _, position_qty = self.get_position_info(token)
+            if position_qty == 0:
+                logger.info(f'Позиция {token} на Orderly уже закрыта')
+                return True
+            side = "SELL" if long else "BUY"
+            json_data = {
+                'symbol': self.symbol(token).name,
+                'client_order_id': uuid.uuid4().hex,
+                'order_type': 'MARKET',
+                'side': side,
+                'reduce_only': True,
+                'order_quantity': position_qty
+            }
+            started = time.perf_counter()
+            response = self._send_order(json_data)
+            fields = {'venue': 'orderly', 'token': token, 'side': side, 'qty': position_qty,
+                      'order_id': json_data['client_order_id'],
+                      'latency_ms': round((time.perf_counter() - started) * 1000, 3)}
             if response['success']:
                 pos = 'Лонг' if long else 'Шорт'
-                logger.info(f'Успешно закрыта {pos} позиция на Orderly: {position_qty} {token}\n')
+                emit(logger, 'order_close', f'Успешно закрыта {pos} позиция на Orderly: {position_qty} {token}\n',
+                     **fields)
                 return True
             else:
-                logger.info(response)
+                emit(logger, 'order_rejected', str(response), logging.INFO, response=response, **fields)
                 return False
         except Exception as e:
             logger.error(f'Проблема с закрытием сделки на Orderly: {e}')
@@ -0,0 +1,61 @@
+import logging
+import math
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+PlannedTrade = namedtuple('PlannedTrade', ['token', 'amount_usd', 'satori_pos', 'tp_sl_delay', 'position_delay',
+                                           'pause'])
+Plan = namedtuple('Plan', ['trades', 'est_seconds', 'est_fees', 'p50_seconds', 'p90_seconds'])
+
+
+def tradable_tokens(tokens, tokens_probs, orderly_tokens, satori_tokens):
+    import numpy as np
+    pairs = [(token, prob) for token, prob in zip(tokens, tokens_probs)
+             if token in orderly_tokens and token in satori_tokens and prob > 0]
+    if not pairs:
+        raise ValueError('Нет токенов, доступных на обеих площадках')
+    total = sum(prob for _, prob in pairs)
+    return [token for token, _ in pairs], np.array([prob / total for _, prob in pairs])
+
+
+def plan_schedule(needed_vol, balance, satori_leverage, tokens, tokens_probs, orderly_tokens, satori_tokens,
+                  trade_amount_usd, tp_sl_time, position_time, trade_pause_time, max_open_pairs=1,
+                  fee_rate=0.0, overhead_seconds=2.0, candidates=2000, seed=None) -> Plan:
+    import numpy as np
+    names, probs = tradable_tokens(tokens, tokens_probs, orderly_tokens, satori_tokens)
+    low, high = trade_amount_usd
+    high = min(high, int(balance * satori_leverage / max_open_pairs))
+    if high < low:
+        raise ValueError(f'Баланса {balance} с плечом {satori_leverage} недостаточно для {max_open_pairs} пар '
+                         f'по {low} USD')
+
+    rng = np.random.default_rng(seed)
+    slots = max_open_pairs
+    n = int(math.ceil(needed_vol / (2 * low)))
+    n += -n % slots
+    shape = (candidates, n)
+    amounts = rng.integers(low, high + 1, size=shape)
+    tp_sl = rng.integers(tp_sl_time[0], tp_sl_time[1] + 1, size=shape)
+    position = rng.integers(position_time[0], position_time[1] + 1, size=shape)
+    pause = rng.integers(trade_pause_time[0], trade_pause_time[1] + 1, size=shape)
+
+    cumulative = np.cumsum(2 * amounts, axis=1)
+    reached = cumulative >= needed_vol
+    trades_needed = np.where(reached.any(axis=1), reached.argmax(axis=1) + 1, n)
+    mask = np.arange(n)[None, :] < trades_needed[:, None]
+    durations = (tp_sl + position + pause + overhead_seconds) * mask
+    seconds = durations.reshape(candidates, -1, slots).sum(axis=1).max(axis=1)
+    fees = (amounts * mask).sum(axis=1) * 2 * fee_rate
+
+    best = int(np.argmin(seconds))
+    count = int(trades_needed[best])
+    token_idx = rng.choice(len(names), size=count, p=probs)
+    sides = rng.integers(0, 2, size=count).astype(bool)
+    trades = [PlannedTrade(names[token_idx[i]], int(amounts[best, i]), bool(sides[i]), int(tp_sl[best, i]),
+                           int(position[best, i]), int(pause[best, i])) for i in range(count)]
+    plan = Plan(trades, float(seconds[best]), float(fees[best]), float(np.percentile(seconds, 50)),
+                float(np.percentile(seconds, 90)))
+    logger.info(f'План: {count} сделок, ~{plan.est_seconds / 3600:.1f} ч до {needed_vol} USD '
+                f'(медиана случайных расписаний {plan.p50_seconds / 3600:.1f} ч), комиссии ~{plan.est_fees:.2f} USD')
+    return plan
@@ -0,0 +1,56 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PositionBook(object):
+    def __init__(self, fetch_all, symbol_key: str, id_key: str, ttl=5.0):
+        self._fetch_all = fetch_all
+        self._symbol_key = symbol_key
+        self._id_key = id_key
+        self._ttl = ttl
+        self._by_symbol = {}
+        self._by_id = {}
+        self._fetched = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._fetched = None
+
+    def _fresh(self):
+        return self._fetched is not None and time.monotonic() - self._fetched <= self._ttl
+
+    def refresh(self):
+        with self._lock:
+            if self._fresh():
+                return
+            positions = self._fetch_all()
+            by_symbol = {}
+            by_id = {}
+            for position in positions:
+                by_symbol.setdefault(position[self._symbol_key], []).append(position)
+                by_id[position[self._id_key]] = position
+            self._by_symbol = by_symbol
+            self._by_id = by_id
+            self._fetched = time.monotonic()
+
+    def _ensure(self):
+        if not self._fresh():
+            self.refresh()
+
+    def get(self, symbol, predicate=None):
+        self._ensure()
+        for position in self._by_symbol.get(symbol, ()):
+            if predicate is None or predicate(position):
+                return position
+        return None
+
+    def by_id(self, position_id):
+        self._ensure()
+        return self._by_id.get(position_id)
+
+    def all(self):
+        self._ensure()
+        return list(self._by_id.values())
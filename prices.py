@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import threading
+import time
+from ws import orderly_stream
+
+logger = logging.getLogger(__name__)
+
+
+class PriceService(object):
+    def __init__(self, tokens, rest_fetchers: dict, orderly_ws_url=None, max_age=5.0, poll_interval=2.0):
+        self._tokens = list(tokens)
+        self._rest = rest_fetchers
+        self._orderly_ws_url = orderly_ws_url
+        self._max_age = max_age
+        self._poll_interval = poll_interval
+        self._prices = {}
+        self._loop = None
+        self._thread = None
+
+    def _store(self, venue, token, price):
+        self._prices[(venue, token)] = (float(price), time.monotonic())
+
+    def get(self, venue: str, token: str):
+        entry = self._prices.get((venue, token))
+        if entry is not None and time.monotonic() - entry[1] <= self._max_age:
+            return entry[0]
+        price = self._rest[venue](token)
+        if price is not None:
+            self._store(venue, token, price)
+        return price
+
+    def age(self, venue: str, token: str):
+        entry = self._prices.get((venue, token))
+        return None if entry is None else time.monotonic() - entry[1]
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='price-service', daemon=True)
+        self._thread.start()
+        ws_venues = set()
+        if self._orderly_ws_url:
+            ws_venues.add('orderly')
+            asyncio.run_coroutine_threadsafe(orderly_stream(self._orderly_ws_url, self._subscriptions,
+                                                            self._on_orderly_message, 'Поток цен Orderly'), self._loop)
+        for venue in self._rest:
+            asyncio.run_coroutine_threadsafe(self._poll(venue, fallback=venue in ws_venues), self._loop)
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _poll(self, venue, fallback):
+        while True:
+            for token in self._tokens:
+                age = self.age(venue, token)
+                if fallback and age is not None and age <= self._max_age:
+                    continue
+                try:
+                    price = await self._loop.run_in_executor(None, self._rest[venue], token)
+                    if price is not None:
+                        self._store(venue, token, price)
+                except Exception as e:
+                    logger.error(f'Ошибка REST обновления цены {token} на {venue}: {e}')
+            await asyncio.sleep(self._poll_interval)
+
+    def _subscriptions(self):
+        return [{'id': f'price-{token}', 'event': 'subscribe', 'topic': f'PERP_{token}_USDC@indexprice'}
+                for token in self._tokens]
+
+    def _on_orderly_message(self, message):
+        data = message.get('data')
+        topic = message.get('topic', '')
+        if not data or not topic.endswith('@indexprice'):
+            return
+        token = data['symbol'].split('_')[1]
+        self._store('orderly', token, data['price'])
@@ -0,0 +1,97 @@
+import threading
+import time
+from contextlib import contextmanager
+from metrics import registry
+
+HIGH = 0
+NORMAL = 1
+LOW = 2
+
+_lanes = threading.local()
+
+
+class TokenBucket(object):
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available_in(self, tokens=1.0) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def try_acquire(self, tokens=1.0) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1.0):
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return
+            time.sleep(wait)
+
+
+@contextmanager
+def lane(priority: int):
+    previous = getattr(_lanes, 'priority', NORMAL)
+    _lanes.priority = priority
+    try:
+        yield
+    finally:
+        _lanes.priority = previous
+
+
+def current_lane() -> int:
+    return getattr(_lanes, 'priority', NORMAL)
+
+
+class RequestScheduler(object):
+    def __init__(self, name: str, venue_bucket: TokenBucket, endpoint_limits=None):
+        self.name = name
+        self._venue = venue_bucket
+        self._limits = dict(endpoint_limits or {})
+        self._endpoints = {}
+        self._waiting = [0, 0, 0]
+        self._cond = threading.Condition()
+
+    def _buckets(self, owner, path):
+        if path not in self._limits:
+            return (self._venue,)
+        bucket = self._endpoints.get((owner, path))
+        if bucket is None:
+            bucket = self._endpoints[(owner, path)] = TokenBucket(*self._limits[path])
+        return self._venue, bucket
+
+    def acquire(self, path: str, priority=NORMAL, owner=None):
+        started = time.perf_counter()
+        with self._cond:
+            buckets = self._buckets(owner, path)
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    wait = None
+                    if not any(self._waiting[:priority]):
+                        wait = max(bucket.available_in() for bucket in buckets)
+                        if wait == 0.0:
+                            for bucket in buckets:
+                                bucket.try_acquire()
+                            break
+                    self._cond.wait(wait)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+        waited = time.perf_counter() - started
+        if waited > 0.001:
+            registry.observe(f'{self.name} ratelimit wait', waited)
@@ -0,0 +1,125 @@
+import logging
+import random
+import threading
+import time
+from requests import RequestException, ConnectTimeout
+from metrics import registry
+from events import emit
+from config import retry_attempts, retry_base_delay, retry_max_delay, breaker_failure_threshold, \
+    breaker_reset_timeout
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class TransientError(Exception):
+    pass
+
+
+class RateLimited(TransientError):
+    pass
+
+
+READ_ERRORS = (RequestException, TransientError, ValueError)
+ORDER_ERRORS = (ConnectTimeout, RateLimited)
+
+
+def raise_for_transient(response):
+    if response.status_code == 429:
+        raise RateLimited(f'HTTP 429 {response.request.method} {response.url}')
+    if response.status_code in TRANSIENT_STATUSES:
+        raise TransientError(f'HTTP {response.status_code} {response.request.method} {response.url}')
+
+
+def retry(fn, name: str, attempts=retry_attempts, base_delay=retry_base_delay, max_delay=retry_max_delay,
+          errors=READ_ERRORS):
+    for attempt in range(1, attempts + 1):
+        try:
+            return fn()
+        except errors as e:
+            if attempt == attempts:
+                registry.inc(f'{name} retries exhausted')
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            registry.inc(f'{name} retries')
+            logger.warning(f'{name}: {e!r}, попытка {attempt + 1}/{attempts} через {delay:.2f} сек')
+            time.sleep(delay)
+
+
+class CircuitBreaker(object):
+    def __init__(self, name: str, failure_threshold=breaker_failure_threshold, reset_timeout=breaker_reset_timeout):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._consecutive = 0
+        self._opened_at = None
+        self._probe_at = 0.0
+        self.failures = 0
+        self.trips = 0
+
+    def success(self):
+        with self._lock:
+            self._consecutive = 0
+            if self._opened_at is None:
+                return
+            recovered = time.monotonic() - self._opened_at
+            self._opened_at = None
+        registry.observe(f'{self.name} recovery', recovered)
+        registry.set(f'{self.name} breaker open', 0)
+        emit(logger, 'venue_recovered', f'Площадка {self.name} снова доступна, восстановление заняло {recovered:.1f} сек',
+             venue=self.name, recovery_s=round(recovered, 3))
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            self._consecutive += 1
+            now = time.monotonic()
+            if self._opened_at is not None:
+                self._probe_at = now + self._reset_timeout
+                tripped = False
+            else:
+                tripped = self._consecutive >= self._failure_threshold
+                if tripped:
+                    self._opened_at = now
+                    self._probe_at = now + self._reset_timeout
+                    self.trips += 1
+            consecutive = self._consecutive
+        registry.inc(f'{self.name} failures')
+        if tripped:
+            registry.inc(f'{self.name} breaker trips')
+            registry.set(f'{self.name} breaker open', 1)
+            emit(logger, 'venue_down', f'Площадка {self.name}: {consecutive} ошибок подряд, новые сделки приостановлены',
+                 logging.ERROR, venue=self.name, consecutive_failures=consecutive, failures=self.failures)
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self._probe_at - time.monotonic())
+
+    @property
+    def open(self) -> bool:
+        return self._opened_at is not None
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name: str) -> CircuitBreaker:
+    found = _breakers.get(name)
+    if found is None:
+        with _breakers_lock:
+            found = _breakers.setdefault(name, CircuitBreaker(name))
+    return found
+
+
+def summary() -> str:
+    lines = []
+    for name, found in sorted(_breakers.items()):
+        if found.failures:
+            state = 'недоступна' if found.open else 'доступна'
+            lines.append(f'{name}: {state}, ошибок {found.failures}, отключений {found.trips}')
+    return '\n'.join(lines)
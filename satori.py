@@ -1,22 +1,28 @@
 import logging
-import requests
-import json
-from config import satori_tokens, satori_leverage, tp_sl_percentage
-from functions import sign_with_key, generate_unique_string
+import threading
+import time
+from config import satori_tokens, satori_leverage, tp_sl_percentage, satori_base_url
+from functions import get_signer
+from order_ids import default_registry
+from transport import create_session
+from metrics import timed
+from events import emit
+from clock import ServerClock
+from auth import TokenManager
+from positions import PositionBook
+from resilience import retry, raise_for_transient, READ_ERRORS, ORDER_ERRORS
+from ratelimit import lane, HIGH, LOW
+from symbols import registry as symbol_registry
+from config import clock_samples, clock_resync_interval, clock_retry_interval, position_cache_ttl, auth_timeout, \
+    presign_min_ttl, presign_price_tolerance, satori_token_ttl, satori_token_refresh_margin, retry_attempts, \
+    retry_base_delay
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+@timed('satori order_id')
 def _generate_order_id():
-    filename = 'satori_orders_ids.json'
-    with open(filename, 'r') as file:
-        satori_ids = json.load(file)
-    order_id = generate_unique_string(satori_ids['orders'])
-    satori_ids['orders'].append(order_id)
-    with open(filename, 'w') as file:
-        json.dump(satori_ids, file, indent=4)
-    return order_id
+    return default_registry().generate()
 
 
 def _build_trading_data(contract_pair_id, token_amount, signature, msg, long, order_id, amount_usd):
@@ -52,13 +58,17 @@ def _build_close_data(position, signature, msg, order_id):
     }
 
 
-def _calculate_tp_sl(entry_price, long, factor):
+def _unauthorized(body):
+    return isinstance(body, dict) and str(body.get('code')) == '401'
+
+
+def _calculate_tp_sl(entry_price, long, factor, round_price):
     if long:
-        lossPrice = round(entry_price - entry_price * factor, 3)
-        profitPrice = round(entry_price + entry_price * factor, 3)
+        lossPrice = round_price(entry_price - entry_price * factor)
+        profitPrice = round_price(entry_price + entry_price * factor)
     else:
-        lossPrice = round(entry_price + entry_price * factor, 3)
-        profitPrice = round(entry_price - entry_price * factor, 3)
+        lossPrice = round_price(entry_price + entry_price * factor)
+        profitPrice = round_price(entry_price - entry_price * factor)
     return lossPrice, profitPrice
 
 
@@ -66,11 +76,23 @@ class SatoriTrading(object):
     def __init__(
             self,
             wallet: dict,
-            api_token=None
+            api_token=None,
+            prices=None,
+            limiter=None,
+            base_url=satori_base_url
     ) -> None:
         self._public_key = wallet['public_key']
         self._private_key = wallet['private_key']
-        self.base_url = 'https://zksync.satori.finance/trade/'
+        self._signer = get_signer(self._private_key)
+        self._venue_url = base_url
+        self._symbols = None
+        self.base_url = base_url + '/trade/'
+        self._api_url = base_url + '/api'
+        self._session = create_session(limiter=limiter, name='satori')
+        self.prices = prices
+        self.positions = PositionBook(self._fetch_positions, 'contractPairId', 'id', ttl=position_cache_ttl)
+        self._clock = ServerClock(self._fetch_server_time, samples=clock_samples,
+                                  resync_interval=clock_resync_interval, retry_interval=clock_retry_interval)
 
         self.headers = {
             'accept': 'application/json, text/plain, */*',
@@ -87,37 +109,87 @@ class SatoriTrading(object):
             'user-agent': wallet['user-agent'],
         }
 
+        self._presigned = {}
+        self._presigned_lock = threading.Lock()
+        self.tokens = TokenManager(self._authenticate, ttl=satori_token_ttl,
+                                   refresh_margin=satori_token_refresh_margin)
         if api_token:
-            self.headers['authorization'] = api_token
-        else:
-            self.generate_api_token()
+            self.tokens.set(api_token)
+        self.tokens.start()
+        threading.Thread(target=self._warm_up, name='satori-warm-up', daemon=True).start()
 
-    def generate_api_token(self):
+    def _warm_up(self):
+        if not self._clock.synced and self._clock.sync():
+            self._clock.start()
+
+    def load_symbols(self) -> dict:
+        self._symbols = symbol_registry.venue('satori', self._venue_url)
+        return self._symbols
+
+    def symbol(self, token: str):
+        symbols = self._symbols if self._symbols is not None else self.load_symbols()
+        return symbols[token]
+
+    def wait_ready(self, timeout=None) -> bool:
+        return self.tokens.token(timeout) is not None
+
+    def _authenticate(self):
         nonce = self._get_nonce()
         try:
-            signature = sign_with_key(self._private_key, nonce)
+            signature = self._signer.sign(nonce)
             sign_data = {'address': self._public_key, 'signature': signature}
-            response = requests.post('https://zksync.satori.finance/api/auth/auth/token',
-                                     headers=self.headers, json=sign_data)
+            response = self._session.post(self._api_url + '/auth/auth/token',
+                                          headers=self.headers, json=sign_data)
             api_token = response.json()['data']
-            self.headers['authorization'] = api_token
             logger.info(f'Новый токен {api_token} для Satori')
+            return api_token
         except Exception as e:
             logger.error(f'Ошибка генерации API токена для Satori: {e}')
+            return None
+
+    def generate_api_token(self):
+        return self.tokens.refresh()
+
+    def _post(self, path: str, json_data=None, referer=None, retry_errors=None):
+        if retry_errors:
+            return retry(lambda: self._post_once(path, json_data, referer, raise_transient=True), f'satori {path}',
+                         errors=retry_errors)
+        return self._post_once(path, json_data, referer)
+
+    def _post_once(self, path: str, json_data=None, referer=None, raise_transient=False):
+        token = self.tokens.token(auth_timeout)
+        for attempt in range(2):
+            headers = dict(self.headers)
+            if token:
+                headers['authorization'] = token
+            if referer:
+                headers['referer'] = referer
+            response = self._session.post(self._api_url + path, headers=headers, json=json_data)
+            if raise_transient:
+                raise_for_transient(response)
+            if attempt or response.status_code != 401:
+                body = response.json()
+                if attempt or not _unauthorized(body):
+                    return body
+            logger.info('Токен Satori отклонен, обновляем и повторяем запрос')
+            token = self.tokens.refresh(stale=token)
 
     def _get_nonce(self):
         json_data = {'address': self._public_key}
         try:
-            response = requests.post('https://zksync.satori.finance/api/auth/auth/generateNonce',
-                                     headers=self.headers, json=json_data)
+            response = self._session.post(self._api_url + '/auth/auth/generateNonce',
+                                          headers=self.headers, json=json_data)
             return response.json()['data']['nonce']
         except Exception as e:
             logger.error(f'Ошибка получения nonce: {e}')
             return None
 
     def get_timestamp(self):
+        return self._clock.now_ms()
+
+    def _fetch_server_time(self):
         try:
-            time = requests.get('https://zksync.satori.finance/api/third/info/time', headers=self.headers)
+            time = self._session.get(self._api_url + '/third/info/time', headers=self.headers)
             timestamp = time.json()['data']
             return timestamp
 
@@ -136,97 +208,181 @@ class SatoriTrading(object):
                 'period': '5MIN',
                 'endTime': timestamp,
             }
-            response = requests.post(
-                'https://zksync.satori.finance/api/contract-quotes-provider/contract-quotes/selectKlinePillarList',
-                headers=self.headers,
-                json=json_data
-            )
-            return response.json()['data'][0]['close']
+            response = self._post('/contract-quotes-provider/contract-quotes/selectKlinePillarList', json_data,
+                                  retry_errors=READ_ERRORS)
+            return response['data'][0]['close']
         except Exception as e:
             logger.error(f'Ошибка получения цены токена {token}: {e}')
             return None
 
     def check_balance(self, token: str) -> float:
         token_info = satori_tokens[token]
-        self.headers['referer'] = self.base_url + token_info['url']
-        response = requests.post('https://zksync.satori.finance/api/contract-provider/contract-account/overview/4',
-                                 headers=self.headers).json()
+        response = self._post('/contract-provider/contract-account/overview/4',
+                              referer=self.base_url + token_info['url'], retry_errors=READ_ERRORS)
         return float(response['data']['availableAmount'])
 
-    def open_market_position(self, token: str, long: bool, amount_usd: int):
+    def _current_price(self, token: str):
+        if self.prices is not None:
+            return self.prices.get('satori', token)
+        return self.get_token_price(token)
+
+    def presign_open_market_position(self, token: str, long: bool, amount_usd: int) -> bool:
+        order = self._build_open_order(token, long, amount_usd)
+        if order is None:
+            return False
+        with self._presigned_lock:
+            self._presigned[(token, long, amount_usd)] = order
+        logger.info(f'Ордер Satori {token} на {amount_usd} USDC подготовлен заранее')
+        return True
+
+    def _take_presigned(self, token: str, long: bool, amount_usd: int):
+        with self._presigned_lock:
+            order = self._presigned.pop((token, long, amount_usd), None)
+        if order is None:
+            return None
+        now = self.get_timestamp()
+        if now is None or order['expire_time'] - now < presign_min_ttl * 1000:
+            logger.info(f'Заготовка ордера Satori {token} устарела по времени')
+            return None
+        price = self._current_price(token)
+        if price is None or abs(price - order['price']) / order['price'] > presign_price_tolerance:
+            logger.info(f'Цена {token} сдвинулась, заготовка ордера Satori сброшена')
+            return None
+        return order
+
+    def prepare_open_market_position(self, token: str, long: bool, amount_usd: int):
+        order = self._take_presigned(token, long, amount_usd)
+        if order is not None:
+            return order
+        return self._build_open_order(token, long, amount_usd)
+
+    def _build_open_order(self, token: str, long: bool, amount_usd: int):
         try:
             order_id = _generate_order_id()
             token_info = satori_tokens[token]
-            self.headers['referer'] = self.base_url + token_info['url']
             contract_pair_id = token_info['contractPairId']
-            token_price = self.get_token_price(token)
+            token_price = self._current_price(token)
             if token_price is None:
-                return None, False
-            token_amount = round(amount_usd / token_price, token_info['decimals'])
+                return None
+            symbol = self.symbol(token)
+            token_amount = symbol.qty_for(amount_usd, token_price)
+            if token_amount <= 0 or token_amount < symbol.min_qty:
+                logger.error(f'Объем {token_amount} {token} меньше минимального на Satori')
+                return None
             trade_timestamp = self.get_timestamp()
             if trade_timestamp is None:
-                return None, False
+                return None
             trade_timestamp += 60504
             msg = f'{{"quantity":{token_amount},"address":"{self._public_key}","expireTime":"{trade_timestamp}","contractPairId":{contract_pair_id},"isClose":false,"amount":{amount_usd}}}'
-            signature = sign_with_key(self._private_key, msg)
-            trading_data = _build_trading_data(token_info['contractPairId'], token_amount, signature, msg, long,
+            signature = self._signer.sign(msg)
+            trading_data = _build_trading_data(contract_pair_id, token_amount, signature, msg, long,
                                                order_id, amount_usd)
+            return {'token': token, 'long': long, 'amount_usd': amount_usd, 'order_id': order_id,
+                    'price': token_price, 'expire_time': trade_timestamp, 'data': trading_data}
+        except Exception as e:
+            logger.error(f'Ошибка подготовки позиции на Satori: {e}')
+            return None
 
-            response = requests.post(
-                'https://zksync.satori.finance/api/contract-provider/contract/order/openPosition',
-                headers=self.headers,
-                json=trading_data
-            ).json()
+    @lane(LOW)
+    def submit_open_market_position(self, order: dict):
+        fields = {'venue': 'satori', 'token': order['token'], 'side': 'BUY' if order['long'] else 'SELL',
+                  'qty': order['data']['quantity'], 'amount_usd': order['amount_usd'], 'order_id': order['order_id']}
+        try:
+            token_info = satori_tokens[order['token']]
+            started = time.perf_counter()
+            response = self._post('/contract-provider/contract/order/openPosition', order['data'],
+                                  referer=self.base_url + token_info['url'], retry_errors=ORDER_ERRORS)
+            fields['latency_ms'] = round((time.perf_counter() - started) * 1000, 3)
+            self.positions.invalidate()
             if response['msg'] == 'SUCCESS':
-                pos = 'Лонг' if long else 'Шорт'
-                logger.info(f'Успешно открыта {pos} позиция на Satori: {token} на {amount_usd} USDC\n'
-                            f'Номер: {order_id}\n')
-                return order_id, True
+                pos = 'Лонг' if order['long'] else 'Шорт'
+                emit(logger, 'order_open', f'Успешно открыта {pos} позиция на Satori: {order["token"]} на '
+                                           f'{order["amount_usd"]} USDC\nНомер: {order["order_id"]}\n', **fields)
+                return order['order_id'], True
             else:
-                logger.error(response)
+                emit(logger, 'order_rejected', str(response), logging.ERROR, response=response, **fields)
                 return None, False
         except Exception as e:
             logger.error(f'Ошибка открытия позиции на Satori: {e}')
             return None, False
 
-    def close_market_position(self, token: str, order_id: str):
+    def open_market_position(self, token: str, long: bool, amount_usd: int):
+        order = self.prepare_open_market_position(token, long, amount_usd)
+        if order is None:
+            return None, False
+        return self.submit_open_market_position(order)
+
+    @lane(HIGH)
+    def close_market_position(self, token: str, order_id=None):
+        try:
+            position = self.get_position(token)
+        except Exception as e:
+            logger.error(f'Ошибка закрытия рыночной позиции на Satori: {e}')
+            return False
+        if not position:
+            return False
+        return self.close_position(position, order_id or _generate_order_id(), token)
+
+    @lane(HIGH)
+    def close_position(self, position: dict, order_id: str, token: str):
         try:
-            position = self._get_position(token)
-            if not position:
+            close_timestamp = self.get_timestamp()
+            if close_timestamp is None:
+                logger.error(f'Нет времени сервера Satori, позиция {token} не закрыта')
                 return False
-            close_timestamp = self.get_timestamp() + 60504
+            close_timestamp += 60504
             msg = f'{{"quantity":{position["quantity"]},"address":"{self._public_key}","expireTime":"{close_timestamp}","contractPairId":{position["contractPairId"]},"isClose":true,"amount":100}}'
-            signature = sign_with_key(self._private_key, msg)
+            signature = self._signer.sign(msg)
             close_data = _build_close_data(position, signature, msg, order_id)
-            response = requests.post('https://zksync.satori.finance/api/contract-provider/contract/order/closePosition',
-                                     headers=self.headers, json=close_data).json()
+            started = time.perf_counter()
+            response = self._post('/contract-provider/contract/order/closePosition', close_data,
+                                  retry_errors=ORDER_ERRORS)
+            fields = {'venue': 'satori', 'token': token, 'side': 'SELL' if position['isLong'] else 'BUY',
+                      'qty': position['quantity'], 'order_id': order_id,
+                      'latency_ms': round((time.perf_counter() - started) * 1000, 3)}
+            self.positions.invalidate()
             if response['msg'] == 'SUCCESS':
                 pos = 'Лонг' if position['isLong'] else 'Шорт'
-                logger.info(f'Успешно закрыта {pos} позиция на Satori: {token}\n'
-                            f'Номер: {order_id}\n')
+                emit(logger, 'order_close', f'Успешно закрыта {pos} позиция на Satori: {token}\n'
+                                            f'Номер: {order_id}\n', **fields)
                 return True
             else:
-                logger.error("Позиция на Satori не была закрыта")
-                logger.error(response)
+                emit(logger, 'order_rejected', f'Позиция на Satori не была закрыта\n{response}', logging.ERROR,
+                     response=response, **fields)
                 return False
         except Exception as e:
             logger.error(f'Ошибка закрытия рыночной позиции на Satori: {e}')
             return False
 
-    def _get_position(self, token: str):
+    def _fetch_positions(self):
+        position_data = {'pageNo': 1, 'pageSize': 100}
+        response = self._post('/contract-provider/contract/selectContractPositionList', position_data,
+                              retry_errors=READ_ERRORS)['data']
+        return response['records']
+
+    def get_position(self, token: str, long=None):
         token_info = satori_tokens[token]
-        self.headers['referer'] = self.base_url + token_info['url']
-        position_data = {'pageNo': 1, 'pageSize': 10}
-        response = \
-            requests.post('https://zksync.satori.finance/api/contract-provider/contract/selectContractPositionList',
-                          headers=self.headers, json=position_data).json()['data']
-        return response['records'][0]
+        if long is None:
+            return self.positions.get(token_info['contractPairId'])
+        return self.positions.get(token_info['contractPairId'], lambda position: position['isLong'] == long)
+
+    def _await_position(self, token: str, long: bool):
+        position = self.get_position(token, long)
+        for _ in range(retry_attempts):
+            if position is not None:
+                break
+            time.sleep(retry_base_delay)
+            self.positions.invalidate()
+            position = self.get_position(token, long)
+        return position
 
+    @lane(HIGH)
     def tp_sl(self, token: str, long: bool):
         try:
-            position = self._get_position(token)
+            position = self._await_position(token, long)
             entry_price = float(position['openingPrice'])
-            lossPrice, profitPrice = _calculate_tp_sl(entry_price, long, tp_sl_percentage)
+            lossPrice, profitPrice = _calculate_tp_sl(entry_price, long, tp_sl_percentage,
+                                                     self.symbol(token).round_price)
             json_data = {
                 'id': position['id'],
                 'lossPrice': lossPrice,
@@ -234,16 +390,19 @@ class SatoriTrading(object):
                 'profitPrice': profitPrice,
                 'profitType': 2,
             }
-            response = requests.post('https://zksync.satori.finance/api/contract-provider/contract/updateStopConfig',
-                                     headers=self.headers, json=json_data).json()
+            started = time.perf_counter()
+            response = self._post('/contract-provider/contract/updateStopConfig', json_data, retry_errors=READ_ERRORS)
+            fields = {'venue': 'satori', 'token': token, 'side': 'SELL' if long else 'BUY',
+                      'qty': position['quantity'], 'position_id': position['id'], 'tp': profitPrice, 'sl': lossPrice,
+                      'latency_ms': round((time.perf_counter() - started) * 1000, 3)}
             if response['msg'] == 'SUCCESS':
-                logger.info(f'Позиция Satori: {token}\n'
-                            f'Ордер: {position["id"]}\n'
-                            f'TP: {profitPrice}\n'
-                            f'SL: {lossPrice}\n')
+                emit(logger, 'tp_sl_set', f'Позиция Satori: {token}\n'
+                                          f'Ордер: {position["id"]}\n'
+                                          f'TP: {profitPrice}\n'
+                                          f'SL: {lossPrice}\n', **fields)
                 return True
             else:
-                logger.error(response)
+                emit(logger, 'tp_sl_rejected', str(response), logging.ERROR, response=response, **fields)
                 return False
         except Exception as e:
             logger.error(f'Ошибка установки TP/SL для токена {token}: {e}')
@@ -0,0 +1,70 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler(object):
+    def __init__(self, workers: int):
+        self._queue = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='lifecycle')
+        self._running = 0
+        self._error = None
+        self._stopped = False
+
+    def call_later(self, delay: float, fn, *args):
+        with self._cond:
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._counter), fn, args))
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return len(self._queue) + self._running
+
+    def stop(self, error=None):
+        with self._cond:
+            if error is not None and self._error is None:
+                self._error = error
+            self._stopped = True
+            self._cond.notify()
+
+    def _execute(self, fn, args):
+        try:
+            fn(*args)
+        except BaseException as e:
+            logger.error(f'Событие {getattr(fn, "__name__", fn)} завершилось ошибкой: {e!r}')
+            self.stop(e)
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._cond.notify()
+
+    def run(self):
+        try:
+            while True:
+                with self._cond:
+                    while True:
+                        if self._stopped or (not self._queue and self._running == 0):
+                            break
+                        if self._queue:
+                            wait = self._queue[0][0] - time.monotonic()
+                            if wait <= 0:
+                                break
+                        else:
+                            wait = None
+                        self._cond.wait(wait)
+                    if self._stopped or not self._queue:
+                        break
+                    _, _, fn, args = heapq.heappop(self._queue)
+                    self._running += 1
+                self._pool.submit(self._execute, fn, args)
+        finally:
+            self._pool.shutdown(wait=True)
+        if self._error is not None:
+            raise self._error
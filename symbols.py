@@ -0,0 +1,141 @@
+import json
+import logging
+import os
+import threading
+import time
+from transport import shared_session
+from config import orderly_tokens, satori_tokens, orderly_base_url, satori_base_url, symbols_cache_path, \
+    symbols_cache_ttl
+
+logger = logging.getLogger(__name__)
+
+
+def _decimals(step: float) -> int:
+    fraction = f'{step:.10f}'.rstrip('0').split('.')[1]
+    return len(fraction)
+
+
+def _quantizer(step: float):
+    decimals = _decimals(step)
+    if decimals == 0:
+        return lambda value: int(round(value / step) * step)
+    return lambda value: round(round(value / step) * step, decimals)
+
+
+class Symbol(object):
+    __slots__ = ('venue', 'token', 'name', 'lot_size', 'tick_size', 'min_qty', 'min_notional', 'round_qty',
+                 'round_price')
+
+    def __init__(self, venue, token, name, lot_size, tick_size, min_qty=0.0, min_notional=0.0):
+        self.venue = venue
+        self.token = token
+        self.name = name
+        self.lot_size = lot_size
+        self.tick_size = tick_size
+        self.min_qty = min_qty
+        self.min_notional = min_notional
+        self.round_qty = _quantizer(lot_size)
+        self.round_price = _quantizer(tick_size)
+
+    def qty_for(self, amount_usd, price):
+        return self.round_qty(amount_usd / float(price))
+
+    def as_dict(self):
+        return {'name': self.name, 'lot_size': self.lot_size, 'tick_size': self.tick_size, 'min_qty': self.min_qty,
+                'min_notional': self.min_notional}
+
+
+def _orderly_from_config():
+    return {token: {'name': f'PERP_{token}_USDC', 'lot_size': 10 ** -info['decimals'],
+                    'tick_size': 10 ** -info['tp_precision'], 'min_qty': 0.0, 'min_notional': 0.0}
+            for token, info in orderly_tokens.items()}
+
+
+def _satori_from_config():
+    return {token: {'name': info['contractPairId'], 'lot_size': 10 ** -info['decimals'], 'tick_size': 0.001,
+                    'min_qty': 0.0, 'min_notional': 0.0}
+            for token, info in satori_tokens.items()}
+
+
+def _fetch_orderly(base_url):
+    rows = shared_session('orderly').get(f'{base_url}/v1/public/info').json()['data']['rows']
+    symbols = _orderly_from_config()
+    for row in rows:
+        _, token, _ = row['symbol'].split('_', 2)
+        symbols[token] = {'name': row['symbol'], 'lot_size': float(row['base_tick']),
+                          'tick_size': float(row['quote_tick']), 'min_qty': float(row.get('base_min', 0)),
+                          'min_notional': float(row.get('min_notional', 0))}
+    return symbols
+
+
+def _fetch_satori(base_url):
+    symbols = _satori_from_config()
+    response = shared_session('satori').get(f'{base_url}/api/contract-provider/contract-pair/list').json()
+    pairs = {info['contractPairId']: token for token, info in satori_tokens.items()}
+    for row in response.get('data') or []:
+        token = pairs.get(row.get('id'))
+        if token is None:
+            continue
+        if row.get('quantityPrecision') is not None:
+            symbols[token]['lot_size'] = 10 ** -int(row['quantityPrecision'])
+        if row.get('pricePrecision') is not None:
+            symbols[token]['tick_size'] = 10 ** -int(row['pricePrecision'])
+        if row.get('minQuantity') is not None:
+            symbols[token]['min_qty'] = float(row['minQuantity'])
+    return symbols
+
+
+FETCHERS = {'orderly': (_fetch_orderly, _orderly_from_config), 'satori': (_fetch_satori, _satori_from_config)}
+BASE_URLS = {'orderly': orderly_base_url, 'satori': satori_base_url}
+
+
+class SymbolRegistry(object):
+    def __init__(self, path=symbols_cache_path, ttl=symbols_cache_ttl):
+        self._path = path
+        self._ttl = ttl
+        self._venues = {}
+        self._lock = threading.Lock()
+
+    def _read_cache(self):
+        if not self._path or not os.path.exists(self._path):
+            return {}
+        with open(self._path, 'r') as file:
+            return json.load(file)
+
+    def _write_cache(self, cache):
+        if not self._path:
+            return
+        tmp = self._path + '.tmp'
+        with open(tmp, 'w') as file:
+            json.dump(cache, file, indent=4)
+        os.replace(tmp, self._path)
+
+    def sync(self, venue: str, base_url=None, force=False):
+        base_url = base_url or BASE_URLS[venue]
+        key = f'{venue} {base_url}'
+        cache = self._read_cache()
+        entry = cache.get(key)
+        if force or entry is None or time.time() - entry['fetched_at'] > self._ttl:
+            fetch, fallback = FETCHERS[venue]
+            try:
+                entry = {'fetched_at': time.time(), 'symbols': fetch(base_url)}
+                cache[key] = entry
+                self._write_cache(cache)
+            except Exception as e:
+                logger.error(f'Не удалось обновить параметры символов {venue}: {e}')
+                if entry is None:
+                    entry = {'fetched_at': 0, 'symbols': fallback()}
+        return {token: Symbol(venue, token, **params) for token, params in entry['symbols'].items()}
+
+    def venue(self, venue: str, base_url=None) -> dict:
+        key = (venue, base_url or BASE_URLS[venue])
+        symbols = self._venues.get(key)
+        if symbols is None:
+            with self._lock:
+                symbols = self._venues.get(key)
+                if symbols is None:
+                    symbols = self._venues[key] = self.sync(venue, key[1])
+        return symbols
+
+
+registry = SymbolRegistry()
@@ -0,0 +1,68 @@
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlsplit
+from metrics import registry
+from ratelimit import current_lane
+from config import http_pool_size, http_timeout, http_retries, http_backoff, endpoint_timeouts
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+
+class PooledSession(requests.Session):
+    def __init__(self, timeout=http_timeout, limiter=None, name='http', timeouts=endpoint_timeouts):
+        super().__init__()
+        self.timeout = timeout
+        self.timeouts = timeouts
+        self.limiter = limiter
+        self.name = name
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeouts.get(urlsplit(url).path, self.timeout))
+        return super().request(method, url, **kwargs)
+
+    def send(self, request, **kwargs):
+        path = urlsplit(request.url).path
+        kwargs.setdefault('timeout', self.timeouts.get(path, self.timeout))
+        if self.limiter is not None:
+            self.limiter.acquire(path, current_lane(), id(self))
+        started = time.perf_counter()
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            registry.observe(f'{self.name} {request.method} {path}', time.perf_counter() - started)
+
+
+def create_session(pool_size=http_pool_size, timeout=http_timeout, retries=http_retries, backoff=http_backoff,
+                   limiter=None, name='http'):
+    session = PooledSession(timeout=timeout, limiter=limiter, name=name)
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=IDEMPOTENT_METHODS,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_shared = {}
+_limiters = {}
+
+
+def attach_limiter(name: str, limiter):
+    _limiters[name] = limiter
+    session = _shared.get(name)
+    if session is not None:
+        session.limiter = limiter
+
+
+def shared_session(name: str):
+    session = _shared.get(name)
+    if session is None:
+        session = _shared.setdefault(name, create_session(limiter=_limiters.get(name), name=name))
+    return session
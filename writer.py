@@ -0,0 +1,62 @@
+import queue
+import threading
+import time
+
+
+class _Flush(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class BatchWriter(object):
+    def __init__(self, write, name: str, batch_size=32, flush_interval=0.2, on_error=None):
+        self._write = write
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._on_error = on_error
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, item):
+        self._queue.put(item)
+
+    def flush(self, timeout=None) -> bool:
+        sentinel = _Flush()
+        self._queue.put(sentinel)
+        if not sentinel.done.wait(timeout):
+            return False
+        if sentinel.error is not None:
+            raise sentinel.error
+        return True
+
+    def _drain(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._flush_interval
+        while len(batch) < self._batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        error = None
+        while True:
+            batch = self._drain()
+            items = [item for item in batch if not isinstance(item, _Flush)]
+            try:
+                if items:
+                    self._write(items)
+            except Exception as e:
+                if self._on_error is not None:
+                    self._on_error(e)
+                error = e
+            for item in batch:
+                if isinstance(item, _Flush):
+                    item.error, error = error, None
+                    item.done.set()
@@ -0,0 +1,29 @@
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def orderly_stream(url: str, subscriptions, on_message, name: str):
+    import aiohttp
+    backoff = 1
+    while True:
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.ws_connect(url, heartbeat=30) as ws:
+                    for message in subscriptions():
+                        await ws.send_json(message)
+                    backoff = 1
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        message = json.loads(msg.data)
+                        if message.get('event') == 'ping':
+                            await ws.send_json({'event': 'pong', 'ts': message.get('ts')})
+                            continue
+                        on_message(message)
+        except Exception as e:
+            logger.error(f'{name} отключен: {e}')
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30)